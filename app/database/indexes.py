@@ -0,0 +1,149 @@
+"""Index management for the hot MongoDB queries.
+
+Runs at application startup (see app.main) and can be run manually:
+
+    python -m app.database.indexes            # create missing indexes
+    python -m app.database.indexes --explain  # also report collection scans
+"""
+import logging
+import sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.database.mongodb import run_script
+from app.services.vision_cache import VISION_CACHE_MONGO_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Declared indexes per collection. create_indexes is a no-op for indexes
+# that already exist with the same spec, so this is safe to run repeatedly.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "user_profiles": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "history": [
+        # _id breaks timestamp ties for keyset pagination of /history
+        IndexModel(
+            [("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="user_id_timestamp_id"
+        ),
+        # Only queued scan jobs carry the image, which keeps this index tiny
+        IndexModel(
+            [("status", ASCENDING), ("timestamp", ASCENDING)],
+            name="queued_scan_jobs",
+            partialFilterExpression={"image": {"$exists": True}}
+        ),
+    ],
+    "user_daily_stats": [
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], name="user_id_day_unique", unique=True),
+    ],
+    "alerts": [
+        IndexModel(
+            [("user_id", ASCENDING), ("severity_rank", DESCENDING), ("timestamp", DESCENDING)],
+            name="user_id_severity_rank_timestamp"
+        ),
+    ],
+    "products": [
+        # Barcode fast path lookups in front of Gemini
+        IndexModel([("barcodes", ASCENDING)], name="barcodes"),
+    ],
+    "vision_cache": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=VISION_CACHE_MONGO_TTL_SECONDS),
+    ],
+}
+
+# Unique keys the write paths rely on to reject duplicates (register_user,
+# profile upserts); the app refuses to start without them
+REQUIRED_UNIQUE_INDEXES = {
+    "users": [("email", ASCENDING)],
+    "user_profiles": [("user_id", ASCENDING)],
+}
+
+# Indexes superseded by the ones above; their key prefix is still covered
+OBSOLETE_INDEXES = {
+    "history": ["user_id_timestamp"],
+}
+
+# Representative shapes of the hot queries, used to check the query plans
+HOT_QUERIES = [
+    ("users", {"email": ""}, None),
+    ("user_profiles", {"user_id": ""}, None),
+    ("history", {"user_id": ""}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("history", {"user_id": "", "timestamp": {"$gte": 0}}, [("timestamp", DESCENDING)]),
+    ("user_daily_stats", {"user_id": "", "day": {"$gte": ""}}, None),
+    ("alerts", {"user_id": "", "timestamp": {"$gte": 0}}, [("severity_rank", DESCENDING), ("timestamp", DESCENDING)]),
+    ("products", {"barcodes": "", "analysis_version": ""}, None),
+]
+
+async def ensure_indexes(db) -> dict:
+    """Create any missing indexes, returning the index names per collection"""
+    created = {}
+    for collection_name, models in INDEXES.items():
+        try:
+            created[collection_name] = await db[collection_name].create_indexes(models)
+        except OperationFailure as e:
+            # e.g. duplicate emails in existing data or a conflicting index spec
+            logger.error("Could not create indexes on %s: %s", collection_name, e)
+            created[collection_name] = []
+    for collection_name, names in OBSOLETE_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection_name].drop_index(name)
+    return created
+
+async def check_required_indexes(db):
+    """Raise unless every index in REQUIRED_UNIQUE_INDEXES exists and is unique"""
+    missing = []
+    for collection_name, keys in REQUIRED_UNIQUE_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        if not any(
+            [tuple(key) for key in info["key"]] == keys and info.get("unique")
+            for info in existing.values()
+        ):
+            missing.append(f"{collection_name}({', '.join(field for field, _ in keys)})")
+    if missing:
+        raise RuntimeError(
+            "Missing unique indexes on " + ", ".join(missing)
+            + "; remove duplicate documents and run python -m app.database.indexes"
+        )
+
+def _find_stages(plan: dict, stage: str) -> bool:
+    if plan.get("stage") == stage:
+        return True
+    children = []
+    if "inputStage" in plan:
+        children.append(plan["inputStage"])
+    children.extend(plan.get("inputStages", []))
+    if "queryPlan" in plan:
+        children.append(plan["queryPlan"])
+    return any(_find_stages(child, stage) for child in children)
+
+async def find_collection_scans(db) -> list:
+    """Explain the hot queries and return the ones planned as a COLLSCAN"""
+    scans = []
+    for collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        if _find_stages(winning_plan, "COLLSCAN"):
+            scans.append({"collection": collection_name, "query": query, "sort": sort})
+    return scans
+
+async def _main(db, explain: bool):
+    for collection_name, names in (await ensure_indexes(db)).items():
+        print(f"{collection_name}: {', '.join(names) or 'failed'}")
+    await check_required_indexes(db)
+    if explain:
+        scans = await find_collection_scans(db)
+        for scan in scans:
+            print(f"COLLSCAN: {scan['collection']} {scan['query']} sort={scan['sort']}")
+        if not scans:
+            print("No collection scans found")
+
+if __name__ == "__main__":
+    run_script(lambda db: _main(db, explain="--explain" in sys.argv[1:]))
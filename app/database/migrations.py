@@ -0,0 +1,51 @@
+"""Data backfills that run once per database, in the background after startup.
+
+Collections derived from history (daily rollups, alerts) start out empty
+on an existing database. Each backfill here claims a document in the
+migrations collection, so only one worker runs it; a failed or interrupted
+run releases its claim and is retried on the next start. Scans stored while a
+backfill runs may be counted slightly off; rerun its command to repair that.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from app.services.scan_stats import backfill_daily_stats
+from app.services.alerts import rederive_alerts
+
+logger = logging.getLogger(__name__)
+
+# (name, backfill(db) -> count) in the order they run
+STARTUP_BACKFILLS = [
+    ("user_daily_stats", backfill_daily_stats),
+    ("alerts", rederive_alerts),
+]
+
+async def run_backfill_once(db, name: str, backfill) -> bool:
+    """Run backfill unless this database already ran it (or another worker is); True if it ran"""
+    migrations = db["migrations"]
+    try:
+        await migrations.insert_one({"_id": name, "status": "running", "started_at": datetime.utcnow()})
+    except DuplicateKeyError:
+        return False
+    try:
+        count = await backfill(db)
+    except BaseException:
+        # Cancelled or failed: let the next start retry it
+        await migrations.delete_one({"_id": name})
+        raise
+    await migrations.update_one(
+        {"_id": name},
+        {"$set": {"status": "done", "finished_at": datetime.utcnow(), "count": count}}
+    )
+    logger.info("Backfilled %s: %d documents", name, count)
+    return True
+
+async def run_startup_backfills(db):
+    for name, backfill in STARTUP_BACKFILLS:
+        try:
+            await run_backfill_once(db, name, backfill)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Backfill %s failed; it will be retried on the next start", name)
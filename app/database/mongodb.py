@@ -1,23 +1,138 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, monitoring
+import asyncio
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Connection pool settings (one shared client per worker process)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so the pool can be sized from real traffic"""
+
+    def __init__(self):
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self.checkouts += 1
+
+    def connection_checked_in(self, event):
+        self.checkins += 1
+
+    def snapshot(self):
+        return {
+            "open_connections": self.connections_created - self.connections_closed,
+            "in_use": self.checkouts - self.checkins,
+            "connections_created": self.connections_created,
+            "connections_closed": self.connections_closed,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "pool_clears": self.pool_clears,
+        }
+
 class MongoDB:
+    """Holds the process-wide AsyncMongoClient and its connection pool"""
+
     def __init__(self):
-        self.client = MongoClient(os.getenv("MONGODB_URI"))
-        self.db = self.client[os.getenv("DB_NAME")]
+        self.client = None
+        self.db = None
+        self.pool_stats = PoolStatsListener()
+
+    def connect(self):
+        if self.client is None:
+            self.client = AsyncMongoClient(
+                os.getenv("MONGODB_URI"),
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                event_listeners=[self.pool_stats],
+            )
+            self.db = self.client[os.getenv("DB_NAME")]
+        return self.db
 
     def get_collection(self, collection_name):
-        return self.db[collection_name]
+        return self.connect()[collection_name]
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            self.db = None
+
+    def get_pool_stats(self):
+        stats = self.pool_stats.snapshot()
+        stats.update({
+            "connected": self.client is not None,
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "max_idle_time_ms": MONGO_MAX_IDLE_TIME_MS,
+        })
+        return stats
+
+# Shared instance, opened and closed by the application lifespan
+mongodb = MongoDB()
+
+def connect_to_mongo():
+    mongodb.connect()
+
+async def close_mongo_connection():
+    await mongodb.close()
+
+def get_collection(collection_name):
+    return mongodb.get_collection(collection_name)
 
-    def close(self):
-        self.client.close()
+async def get_database():
+    yield mongodb.connect()
 
-def get_database():
-    db_instance = MongoDB()
-    try:
-        yield db_instance.db
-    finally:
-        db_instance.close()
\ No newline at end of file
+def run_script(task):
+    """Run task(db) on a fresh connection and return its result; for the python -m maintenance commands"""
+    async def run():
+        db = mongodb.connect()
+        try:
+            return await task(db)
+        finally:
+            await mongodb.close()
+    return asyncio.run(run())
@@ -1,11 +1,49 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import auth, genai, get_history, profile, dashboard
+from app.database.mongodb import connect_to_mongo, close_mongo_connection, mongodb
+from app.database.indexes import ensure_indexes, check_required_indexes
+from app.database.migrations import run_startup_backfills
+from app.services.phash import near_duplicate_index
+from app.services.scan_jobs import scan_jobs
+from app.services.metrics import TimingMiddleware, render_metrics, span
+from app.services.compression import CompressionMiddleware
+from app.routes import auth, genai, get_history, profile, dashboard, stats
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled MongoDB client per worker for the lifetime of the app
+    with span("mongo_connect"):
+        connect_to_mongo()
+    if os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true":
+        with span("mongo_ensure_indexes"):
+            await ensure_indexes(mongodb.db)
+    # Checked even with MONGO_ENSURE_INDEXES=false, so duplicates cannot slip in unnoticed
+    await check_required_indexes(mongodb.db)
+    with span("near_duplicate_rebuild"):
+        await near_duplicate_index.rebuild(mongodb.db)
+    await scan_jobs.start(genai.process_scan_job)
+    # Derived collections of an existing database fill in while the app serves
+    backfills = None
+    if os.getenv("STARTUP_BACKFILLS", "true").lower() == "true":
+        backfills = asyncio.create_task(run_startup_backfills(mongodb.db))
+    try:
+        yield
+    finally:
+        if backfills is not None:
+            backfills.cancel()
+            await asyncio.gather(backfills, return_exceptions=True)
+        await scan_jobs.stop()
+        await close_mongo_connection()
 
 app = FastAPI(
     title="Health GenAI API",
     description="A FastAPI backend for health-related AI services",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -15,7 +53,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# gzip/brotli for larger JSON bodies
+app.add_middleware(CompressionMiddleware)
+# Per-route latency histograms and the Server-Timing header
+app.add_middleware(TimingMiddleware)
 
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
@@ -23,6 +66,7 @@ app.include_router(profile.router, prefix="/api/v1/user", tags=["User Profile"])
 app.include_router(genai.router, prefix="/api/v1/genai", tags=["GenAI"])
 app.include_router(get_history.router, prefix="/api/v1/genai", tags=["GenAI History"])
 app.include_router(dashboard.router, prefix="/api/v1/dashboard", tags=["Dashboard"])
+app.include_router(stats.router, prefix="/api/v1/stats", tags=["Stats"])
 
 @app.get("/")
 async def root():
@@ -32,6 +76,11 @@ async def root():
         "redoc": "/redoc"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Latency histograms in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     import os
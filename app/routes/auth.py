@@ -18,6 +18,8 @@ async def register(user: UserRegister):
     try:
         token, user_id = await register_user(user.email, user.name, user.password)
         return {"message": "User registered successfully", "access_token": token, "user_id": user_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -26,5 +28,7 @@ async def login(user: UserLogin):
     try:
         token, user_id, user_name = await login_user(user.email, user.password)
         return {"access_token": token, "user_id": user_id, "name": user_name, "status": "ok"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -1,23 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime, date, timezone, timedelta
 from app.database.mongodb import get_database
+from app.services.scan_jobs import COMPLETED_SCAN_FILTER
+from app.services.scan_stats import get_daily_stats
+from app.services.alerts import derive_alert, SEVERITY_RANKS
+from app.services.metrics import span
+from app.services.json_response import FastJSONResponse
+from app.services.timezones import IST, to_ist
+from app.services.history import history_etag, etag_matches
+import asyncio
 from bson import ObjectId
 
 router = APIRouter()
 
-# IST timezone (UTC+5:30)
-IST = timezone(timedelta(hours=5, minutes=30))
-
-def convert_utc_to_ist(utc_datetime: datetime) -> str:
-    """Convert UTC datetime to IST string"""
-    if utc_datetime.tzinfo is None:
-        # Assume UTC if no timezone info
-        utc_datetime = utc_datetime.replace(tzinfo=timezone.utc)
-    
-    ist_datetime = utc_datetime.astimezone(IST)
-    return ist_datetime.isoformat()
+# Only the fields the summaries and alerts read, leaving out ingredients, nutrition facts and recipes
+SCAN_SUMMARY_PROJECTION = {
+    "timestamp": 1,
+    "response.product_name": 1,
+    "response.rating": 1,
+    "response.category": 1,
+    "response.concerns": 1,
+    "response.processing_level": 1,
+    "response.allergens": 1
+}
 
 class TodayOverview(BaseModel):
     scans_today: int
@@ -54,97 +61,86 @@ class DashboardResponse(BaseModel):
     alerts: List[AlertItem]
     weekly_stats: WeeklyStats
 
-def generate_alerts_from_scan(scan_data: Dict[str, Any], scan_id: str, timestamp: datetime) -> List[AlertItem]:
-    """Generate consolidated alerts based on scan data"""
-    response_data = scan_data.get("response", {})
-    product_name = response_data.get("product_name", "Unknown Product")
-    
-    # Collect all concerns for this product
-    alert_messages = []
-    alert_types = []
-    max_severity = "low"
-    
-    # Check for poor rating
-    rating = response_data.get("rating", "").lower()
-    if rating == "poor":
-        alert_messages.append("📉 Poor nutritional rating")
-        alert_types.append("poor_rating")
-        max_severity = "high"
-    
-    # Check for high concerns
-    concerns = response_data.get("concerns", 0)
-    if concerns >= 3:
-        alert_messages.append(f"🚨 {concerns} ingredient concerns")
-        alert_types.append("high_concerns")
-        if concerns >= 5:
-            max_severity = "high"
-        elif max_severity != "high":
-            max_severity = "medium"
-    
-    # Check for highly processed foods
-    processing_level = response_data.get("processing_level", "").lower()
-    if processing_level == "highly_processed":
-        alert_messages.append("🏭 Highly processed")
-        alert_types.append("highly_processed")
-        if max_severity == "low":
-            max_severity = "medium"
-    
-    # Check for allergens
-    allergens = response_data.get("allergens", [])
-    if allergens:
-        alert_messages.append(f"⚠️ Contains allergens: {', '.join(allergens)}")
-        alert_types.append("allergen_warning")
-        max_severity = "high"
+# Stored alert fields returned by /alerts, in AlertItem shape
+ALERT_ITEM_PROJECTION = {"_id": 0, **{field: 1 for field in AlertItem.model_fields}}
+
+def generate_alerts_from_scan(scan_data: Dict[str, Any], scan_id: str, timestamp: datetime) -> List[Dict[str, Any]]:
+    """Generate consolidated alerts (AlertItem fields) based on scan data"""
+    alert = derive_alert(scan_data.get("response", {}))
     
     # If no alerts, return empty list
-    if not alert_messages:
+    if alert is None:
         return []
     
-    # Create single consolidated alert
-    consolidated_message = f"{product_name} - " + " | ".join(alert_messages)
-    consolidated_alert_type = "_".join(alert_types)
+    return [{
+        "alert_id": f"{scan_id}_{alert['alert_type']}",
+        "scan_id": scan_id,
+        "timestamp": timestamp,
+        **alert
+    }]
+
+def summarize_scan(scan: Dict[str, Any]) -> Dict[str, Any]:
+    """ScanSummary fields of a projected scan, left for FastJSONResponse to serialize"""
+    response_data = scan.get("response", {})
+    return {
+        "scan_id": scan["_id"],
+        "product_name": response_data.get("product_name", "Unknown Product"),
+        "rating": response_data.get("rating", "unknown"),
+        "category": response_data.get("category", "unknown"),
+        "concerns": response_data.get("concerns", 0),
+        "timestamp": scan.get("timestamp") or "",
+        "processing_level": response_data.get("processing_level", "unknown")
+    }
+
+def summarize_weekly_stats(daily_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold up to 7 daily rollups into the weekly stats"""
+    total_scans = sum(day.get("scans", 0) for day in daily_stats)
+    total_concerns = sum(day.get("concerns_total", 0) for day in daily_stats)
+    category_counts = {}
+    for day in daily_stats:
+        for category, count in day.get("categories", {}).items():
+            category_counts[category] = category_counts.get(category, 0) + count
     
-    return [AlertItem(
-        alert_id=f"{scan_id}_{consolidated_alert_type}",
-        product_name=product_name,
-        alert_type=consolidated_alert_type,
-        alert_message=consolidated_message,
-        severity=max_severity,
-        timestamp=convert_utc_to_ist(timestamp),
-        scan_id=scan_id
-    )]
+    most_scanned_category = max(category_counts.items(), key=lambda x: x[1])[0] if category_counts else "none"
+    avg_concerns = total_concerns / total_scans if total_scans else 0
+    
+    return {
+        "total_scans": total_scans,
+        "healthy_products": sum(day.get("healthy", 0) for day in daily_stats),
+        "concerning_products": sum(day.get("concerning", 0) for day in daily_stats),
+        "average_concerns_per_product": round(avg_concerns, 2),
+        "most_scanned_category": most_scanned_category
+    }
 
-@router.get("/overview/{user_id}", response_model=DashboardResponse)
+@router.get("/overview/{user_id}", response_model=DashboardResponse, response_class=FastJSONResponse)
 async def get_dashboard_overview(
     user_id: str,
+    request: Request,
     db=Depends(get_database)
 ):
     """Get dashboard overview for a user"""
     try:
         history_collection = db['history']
         
-        # Get today's date range in IST, then convert to UTC for database query
-        ist_now = datetime.now(IST)
-        ist_today = ist_now.date()
-        
-        # Create IST start and end of day, then convert to UTC
-        ist_start_of_day = datetime.combine(ist_today, datetime.min.time()).replace(tzinfo=IST)
-        ist_end_of_day = datetime.combine(ist_today, datetime.max.time()).replace(tzinfo=IST)
-        
-        # Convert to UTC for database query
-        utc_start_of_day = ist_start_of_day.astimezone(timezone.utc).replace(tzinfo=None)
-        utc_end_of_day = ist_end_of_day.astimezone(timezone.utc).replace(tzinfo=None)
-        
-        # Get today's scans using UTC range
-        today_scans = list(history_collection.find({
-            "user_id": user_id,
-            "timestamp": {"$gte": utc_start_of_day, "$lte": utc_end_of_day}
-        }).sort("timestamp", -1))
-        
-        # Get recent scans (last 10)
-        recent_scans = list(history_collection.find({
-            "user_id": user_id
-        }).sort("timestamp", -1).limit(10))
+        # Today and the 6 days before it, as IST calendar days
+        ist_today = datetime.now(IST).date()
+        week_start = ist_today - timedelta(days=6)
+        
+        # The overview only changes with new scans or when the IST day rolls over
+        etag = await history_etag(db, user_id, ist_today.isoformat())
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        # At most 7 small rollup documents plus the 10 latest projected scans, fetched concurrently
+        with span("dashboard_overview_query"):
+            daily_stats, recent_scans = await asyncio.gather(
+                get_daily_stats(db, user_id, week_start, ist_today),
+                history_collection.find(
+                    {"user_id": user_id, **COMPLETED_SCAN_FILTER},
+                    SCAN_SUMMARY_PROJECTION
+                ).sort("timestamp", -1).limit(10).to_list(length=None)
+            )
+        today_count = sum(day.get("scans", 0) for day in daily_stats if day["day"] == ist_today.isoformat())
         
         # Generate alerts from recent scans
         all_alerts = []
@@ -154,76 +150,22 @@ async def get_dashboard_overview(
             alerts = generate_alerts_from_scan(scan, scan_id, timestamp)
             all_alerts.extend(alerts)
         
-        # Sort alerts by severity and timestamp
-        severity_order = {"high": 0, "medium": 1, "low": 2}
-        all_alerts.sort(key=lambda x: (severity_order.get(x.severity, 3), x.timestamp), reverse=True)
+        # Most severe and newest first, the same order /alerts uses
+        all_alerts.sort(key=lambda x: (SEVERITY_RANKS.get(x["severity"], 0), x["timestamp"]), reverse=True)
         
         # Limit to most recent/important alerts
         all_alerts = all_alerts[:10]
         
-        # Create scan summaries
-        scan_summaries = []
-        for scan in recent_scans:
-            response_data = scan.get("response", {})
-            timestamp = scan.get("timestamp")
-            scan_summaries.append(ScanSummary(
-                scan_id=str(scan["_id"]),
-                product_name=response_data.get("product_name", "Unknown Product"),
-                rating=response_data.get("rating", "unknown"),
-                category=response_data.get("category", "unknown"),
-                concerns=response_data.get("concerns", 0),
-                timestamp=convert_utc_to_ist(timestamp) if timestamp else "",
-                processing_level=response_data.get("processing_level", "unknown")
-            ))
-        
-        # Calculate weekly stats (last 7 days)
-        week_ago = datetime.now() - timedelta(days=7)
-        week_ago = week_ago.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        weekly_scans = list(history_collection.find({
-            "user_id": user_id,
-            "timestamp": {"$gte": week_ago}
-        }))
-        
-        healthy_count = 0
-        concerning_count = 0
-        total_concerns = 0
-        category_counts = {}
-        
-        for scan in weekly_scans:
-            response_data = scan.get("response", {})
-            rating = response_data.get("rating", "").lower()
-            concerns = response_data.get("concerns", 0)
-            category = response_data.get("category", "unknown")
-            
-            if rating in ["good", "excellent"]:
-                healthy_count += 1
-            elif rating == "poor" or concerns >= 3:
-                concerning_count += 1
-            
-            total_concerns += concerns
-            category_counts[category] = category_counts.get(category, 0) + 1
-        
-        most_scanned_category = max(category_counts.items(), key=lambda x: x[1])[0] if category_counts else "none"
-        avg_concerns = total_concerns / len(weekly_scans) if weekly_scans else 0
-        
-        weekly_stats = WeeklyStats(
-            total_scans=len(weekly_scans),
-            healthy_products=healthy_count,
-            concerning_products=concerning_count,
-            average_concerns_per_product=round(avg_concerns, 2),
-            most_scanned_category=most_scanned_category
-        )
-        
-        return DashboardResponse(
-            today_overview=TodayOverview(
-                scans_today=len(today_scans),
-                alerts=len(all_alerts)
-            ),
-            recent_scans=scan_summaries,
-            alerts=all_alerts,
-            weekly_stats=weekly_stats
-        )
+        # Plain dicts in DashboardResponse shape, serialized once by FastJSONResponse
+        return FastJSONResponse({
+            "today_overview": {
+                "scans_today": today_count,
+                "alerts": len(all_alerts)
+            },
+            "recent_scans": [summarize_scan(scan) for scan in recent_scans],
+            "alerts": all_alerts,
+            "weekly_stats": summarize_weekly_stats(daily_stats)
+        }, headers={"ETag": etag})
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -249,10 +191,12 @@ async def get_today_scans(
         utc_start_of_day = ist_start_of_day.astimezone(timezone.utc).replace(tzinfo=None)
         utc_end_of_day = ist_end_of_day.astimezone(timezone.utc).replace(tzinfo=None)
         
-        today_scans = list(history_collection.find({
-            "user_id": user_id,
-            "timestamp": {"$gte": utc_start_of_day, "$lte": utc_end_of_day}
-        }).sort("timestamp", -1))
+        with span("dashboard_today_query"):
+            today_scans = await history_collection.find({
+                "user_id": user_id,
+                **COMPLETED_SCAN_FILTER,
+                "timestamp": {"$gte": utc_start_of_day, "$lte": utc_end_of_day}
+            }, SCAN_SUMMARY_PROJECTION).sort("timestamp", -1).to_list(length=None)
         
         scan_summaries = []
         for scan in today_scans:
@@ -264,7 +208,7 @@ async def get_today_scans(
                 rating=response_data.get("rating", "unknown"),
                 category=response_data.get("category", "unknown"),
                 concerns=response_data.get("concerns", 0),
-                timestamp=convert_utc_to_ist(timestamp) if timestamp else "",
+                timestamp=to_ist(timestamp).isoformat() if timestamp else "",
                 processing_level=response_data.get("processing_level", "unknown")
             ))
         
@@ -276,40 +220,27 @@ async def get_today_scans(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/alerts/{user_id}")
+@router.get("/alerts/{user_id}", response_class=FastJSONResponse)
 async def get_user_alerts(
     user_id: str,
     limit: int = 20,
     db=Depends(get_database)
 ):
-    """Get alerts for a user based on their scan history"""
+    """Get alerts for a user, derived when each scan was stored"""
     try:
-        history_collection = db['history']
-        
-        # Get recent scans (last 30 days)
+        # Get stored alerts from the last 30 days, most severe and newest first
         thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_scans = list(history_collection.find({
-            "user_id": user_id,
-            "timestamp": {"$gte": thirty_days_ago}
-        }).sort("timestamp", -1))
-        
-        # Generate alerts
-        all_alerts = []
-        for scan in recent_scans:
-            scan_id = str(scan["_id"])
-            timestamp = scan.get("timestamp")
-            alerts = generate_alerts_from_scan(scan, scan_id, timestamp)
-            all_alerts.extend(alerts)
-        
-        # Sort and limit alerts
-        severity_order = {"high": 0, "medium": 1, "low": 2}
-        all_alerts.sort(key=lambda x: (severity_order.get(x.severity, 3), x.timestamp), reverse=True)
-        all_alerts = all_alerts[:limit]
-        
-        return {
-            "count": len(all_alerts),
-            "alerts": all_alerts
-        }
+        with span("dashboard_alerts_query"):
+            alert_docs = await db['alerts'].find({
+                "user_id": user_id,
+                "timestamp": {"$gte": thirty_days_ago}
+            }, ALERT_ITEM_PROJECTION).sort([("severity_rank", -1), ("timestamp", -1)]).limit(limit).to_list(length=None)
+        
+        # Projected documents already have the AlertItem fields
+        return FastJSONResponse({
+            "count": len(alert_docs),
+            "alerts": alert_docs
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
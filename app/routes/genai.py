@@ -1,15 +1,35 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 import os
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime
 from google import genai
-from PIL import Image
-import io
-from typing import List, Dict, Any, Optional
-from app.database.mongodb import get_database
+from google.genai import types
+from typing import List, Dict, Any, Optional, Tuple
+from app.database.mongodb import get_database, get_collection, mongodb
+from app.services.vision_cache import vision_cache
+from app.services.phash import hash_to_hex, near_duplicate_index
+from app.services.image_preprocess import preprocess_image, PreprocessedImage
+from app.services.limiter import gemini_limiter
+from app.services.scan_jobs import scan_jobs
+from app.services.history import on_scans_stored
+from app.services.products import product_index, summarize_analysis
+from app.services.barcode import decode_barcode
+from app.services.metrics import span
+from bson import ObjectId, Binary
+from pymongo import ReturnDocument
 from fastapi import status
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 # Updated Pydantic models for detailed output schema
 class NutritionFact(BaseModel):
     name: str
@@ -40,99 +60,430 @@ class GeminiVisionResponse(BaseModel):
     category: str  # "beverage", "cereal", "snack", "meal", etc.
     processing_level: str  # "semi_processed", "processed", "highly_processed"
 
+class ScanJobResponse(BaseModel):
+    scan_id: str
+    status: str  # "pending", "processing", "completed", "failed"
+    result: Optional[GeminiVisionResponse] = None
+    error: Optional[str] = None
+
+class BatchScanItem(BaseModel):
+    file_names: List[str]
+    scan_id: Optional[str] = None
+    result: Optional[GeminiVisionResponse] = None
+    error: Optional[str] = None
+
+class BatchVisionResponse(BaseModel):
+    mode: str  # "merge" or "fanout"
+    results: List[BatchScanItem]
+
 # Ensure your environment has GOOGLE_API_KEY
 client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
 # Use a current Gemini model (e.g. gemini‑2.5‑flash)
 MODEL_NAME = "gemini-2.5-flash"
 
-async def get_gemini_response(image_bytes: bytes) -> GeminiVisionResponse:
-    img = Image.open(io.BytesIO(image_bytes))
-    contents = [
-        """Analyze the food product in this image and respond ONLY with a valid JSON object with the following detailed structure:
-
-{
-  "product_name": "string - the product name",
-  "serving_size": "string - serving size (e.g., '30g', '1 cup')",
-  "calories": "string - calories per serving (e.g., '154.5')",
-  "total_ingredients": "number - total count of ingredients",
-  "ingredient_categories": [
-    {
-      "category_name": "string - category name (e.g., 'Good for You', 'Sugar & Substitutes', 'Refined Grains & Oils', 'Additives', 'Others')",
-      "count": "number - count of ingredients in this category",
-      "ingredients": ["array of ingredient names"],
-      "color_code": "string - 'green' for healthy, 'yellow' for moderate, 'red' for concerning, 'gray' for neutral"
-    }
-  ],
-  "nutrition_facts": [
-    {
-      "name": "string - nutrient name (e.g., 'Sodium', 'Total Fat')",
-      "amount": "string - amount with unit (e.g., '63.69mg', '10.65g')",
-      "percentage_dv": "string - percentage daily value (e.g., '2.65%') or null if not applicable",
-      "category": "string - 'good_for_you' for beneficial nutrients, 'others' for neutral, 'concerns' for high amounts"
-    }
-  ],
-  "concerns": "number - count of concerning ingredients/aspects",
-  "concerns_message": "string - message about concerns (e.g., 'Yay! This Product has NO Ingredient Concerns.' or specific concerns)",
-  "additives": ["array of additive ingredients"],
-  "allergens": ["array of allergens present"],
-  "allergens_message": "string - allergen information message",
-  "alternate_home_made_recipe": "string - homemade recipe alternative",
-  "rating": "string - 'poor', 'average', 'good', or 'excellent' based on nutritional value",
-  "category": "string - food category like 'beverage', 'cereal', 'snack', 'meal', 'dairy', 'bakery', 'candy', 'frozen'",
-  "processing_level": "string - 'semi_processed', 'processed', or 'highly_processed'"
-}
+# Bump whenever the prompt changes so cached results from the old prompt are not reused
+PROMPT_VERSION = "2"
+# Shared product analyses are per model and prompt; changing either starts new products
+ANALYSIS_VERSION = f"{MODEL_NAME}/{PROMPT_VERSION}"
+
+# The JSON shape is enforced through response_schema, so the prompt only carries the rules
+VISION_PROMPT = """Analyze the food product in this image.
 
 Guidelines:
 - Categorize ingredients as: 'Good for You' (nuts, seeds, whole grains, natural ingredients), 'Sugar & Substitutes' (all sweeteners), 'Refined Grains & Oils' (processed grains/oils), 'Additives' (artificial ingredients, preservatives), 'Others' (neutral ingredients)
-- For nutrition_facts, include major nutrients like sodium, carbs, sugars, fiber, protein, fats, vitamins, minerals
 - Use green color_code for healthy categories, yellow for moderate, red for concerning, gray for neutral
-- Provide detailed percentage daily values based on 2000 calorie diet
+- For nutrition_facts, include major nutrients like sodium, carbs, sugars, fiber, protein, fats, vitamins, minerals; category is 'good_for_you', 'others' or 'concerns'
+- Provide detailed percentage daily values based on 2000 calorie diet, or null if not applicable
+- concerns is the count of concerning ingredients/aspects; concerns_message explains them (e.g. 'Yay! This Product has NO Ingredient Concerns.')
+- rating is 'poor', 'average', 'good' or 'excellent' based on nutritional value
+- category is a food category like 'beverage', 'cereal', 'snack', 'meal', 'dairy', 'bakery', 'candy', 'frozen'
+- processing_level is 'semi_processed', 'processed' or 'highly_processed'
 - Be specific about serving sizes and calorie counts
-- If information is not clearly visible, make reasonable estimates based on similar products
+- If information is not clearly visible, make reasonable estimates based on similar products"""
+
+VISION_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=GeminiVisionResponse
+)
+
+# One automatic retry when the model output fails validation
+GEMINI_PARSE_ATTEMPTS = 2
+# Fraction of raw Gemini responses written to the debug log, and how much of each
+GEMINI_DEBUG_LOG_SAMPLE_RATE = float(os.getenv("GEMINI_DEBUG_LOG_SAMPLE_RATE", "0.01"))
+GEMINI_DEBUG_LOG_MAX_CHARS = int(os.getenv("GEMINI_DEBUG_LOG_MAX_CHARS", "2000"))
+
+# Read EAN/UPC codes locally and reuse the analysis of a product already seen with that code
+BARCODE_LOOKUP_ENABLED = os.getenv("BARCODE_LOOKUP_ENABLED", "true").lower() == "true"
+
+# Attempts a background scan job makes while Gemini is saturated
+SCAN_JOB_MAX_ATTEMPTS = 3
+# How often the SSE stream re-checks a job that another worker may be running
+SCAN_JOB_EVENTS_POLL_SECONDS = 2
+# The stream gives up after this long, e.g. on a job lost with a restarted worker's local queue
+SCAN_JOB_EVENTS_TIMEOUT_SECONDS = float(os.getenv("SCAN_JOB_EVENTS_TIMEOUT_SECONDS", "300"))
+
+# Images accepted by /vision/batch, and how many of them are analyzed at once in fanout mode
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "6"))
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "3"))
+
+def log_raw_response(raw: str):
+    """Debug-log a sample of raw Gemini responses, truncated"""
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= GEMINI_DEBUG_LOG_SAMPLE_RATE:
+        return
+    if len(raw) > GEMINI_DEBUG_LOG_MAX_CHARS:
+        raw = f"{raw[:GEMINI_DEBUG_LOG_MAX_CHARS]}... [{len(raw)} chars]"
+    logger.debug("Gemini raw response: %s", raw)
 
-Do not include any text or explanation before or after the JSON.""",
-        img
+async def get_gemini_response(
+    image_bytes: bytes,
+    mime_type: str = "image/jpeg",
+    extra_images: Optional[List[Tuple[bytes, str]]] = None
+) -> GeminiVisionResponse:
+    contents = [
+        VISION_PROMPT,
+        types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
     ]
-    response = client.models.generate_content(
-        model=MODEL_NAME,
-        contents=contents
+    if extra_images:
+        # Several photos of one packet (front, nutrition label, ingredients) in a single call
+        contents.insert(1, "All of the following images show the same product from different sides; combine them into one analysis.")
+        contents.extend(types.Part.from_bytes(data=data, mime_type=mime) for data, mime in extra_images)
+
+    last_error = None
+    for attempt in range(GEMINI_PARSE_ATTEMPTS):
+        # Async client so the worker keeps serving other requests during the model call
+        async with gemini_limiter.slot():
+            with span("gemini_call"):
+                response = await client.aio.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=contents,
+                    config=VISION_CONFIG
+                )
+        raw = response.text or ""
+        log_raw_response(raw)
+        try:
+            # The schema is enforced by the API, so a single validating parse is enough
+            with span("gemini_parse"):
+                return GeminiVisionResponse.model_validate_json(raw)
+        except ValidationError as e:
+            last_error = e
+    raise HTTPException(status_code=500, detail=f"Failed to parse Gemini response: {last_error}. Raw response: {raw}")
+
+async def find_near_duplicate(db, image_hash: int) -> Optional[GeminiVisionResponse]:
+    """Reuse the analysis of an earlier scan of (almost) the same photo, if any"""
+    for history_id in near_duplicate_index.find(image_hash):
+        doc = await db['history'].find_one({"_id": ObjectId(history_id)}, {"response": 1, "product_id": 1})
+        if doc and doc.get("response"):
+            await product_index.hydrate([doc])
+            return GeminiVisionResponse(**doc["response"])
+    return None
+
+async def prepare_image(img_bytes: bytes) -> PreprocessedImage:
+    # Downscale, re-encode and strip EXIF off the event loop
+    with span("image_preprocess"):
+        image = await run_in_threadpool(preprocess_image, img_bytes)
+    logger.info(
+        "Preprocessed upload: %d -> %d bytes (%d saved) in %.1f ms",
+        image.original_bytes, image.processed_bytes, image.bytes_saved, image.elapsed_ms
     )
-    import json
-    # Debug: print/log the raw response for troubleshooting
-    print('Gemini raw response:', response.text)
-    raw = response.text.strip()
-    # Remove code block markers if present
-    if raw.startswith('```json'):
-        raw = raw[len('```json'):].strip()
-    if raw.startswith('```'):
-        raw = raw[len('```'):].strip()
-    if raw.endswith('```'):
-        raw = raw[:-3].strip()
-    if not raw:
-        raise HTTPException(status_code=500, detail="Gemini returned an empty response.")
+    return image
+
+async def resolve_product(result: GeminiVisionResponse) -> Tuple[GeminiVisionResponse, Optional[str]]:
+    """The shared canonical analysis for the scanned product, and its products id"""
+    product_id, analysis = await product_index.resolve(result.dict(), ANALYSIS_VERSION)
+    if product_id is None:
+        return result, None
+    return GeminiVisionResponse(**analysis), product_id
+
+def history_response(result: GeminiVisionResponse, product_id: Optional[str]) -> Dict[str, Any]:
+    # Scans of a known product keep a summary; the full analysis lives in products
+    return summarize_analysis(result.dict()) if product_id else result.dict()
+
+async def read_barcode(image: PreprocessedImage) -> Optional[str]:
+    """EAN/UPC code in the photo, decoded off the event loop"""
+    try:
+        with span("barcode_decode"):
+            return await run_in_threadpool(decode_barcode, image.data)
+    except Exception:
+        # The decoder is only a shortcut; Gemini still handles the image
+        logger.exception("Barcode decoding failed")
+        return None
+
+def make_history_doc(
+    user_id: Optional[str],
+    result: GeminiVisionResponse,
+    image_hash: Optional[int] = None,
+    product_id: Optional[str] = None
+) -> Dict[str, Any]:
+    history_doc = {
+        "user_id": user_id,
+        "response": history_response(result, product_id),
+        "timestamp": datetime.utcnow()
+    }
+    if product_id:
+        history_doc["product_id"] = product_id
+    if image_hash is not None:
+        history_doc["phash"] = hash_to_hex(image_hash)
+    return history_doc
+
+async def analyze_image(db, img_bytes: bytes, response: Optional[Response] = None) -> Tuple[GeminiVisionResponse, Optional[int]]:
+    """Run an upload through preprocessing, the caches and Gemini.
+
+    Returns the analysis and, when it came fresh from Gemini, the perceptual
+    hash to store with the scan.
+    """
+    image = await prepare_image(img_bytes)
+    if response is not None:
+        response.headers["X-Image-Bytes-Saved"] = str(image.bytes_saved)
+        response.headers["X-Image-Preprocess-Ms"] = str(image.elapsed_ms)
+
+    # Keyed on the bytes sent to Gemini; re-encoded uploads hit even if only their metadata differs
+    cache_key = vision_cache.make_key(image.data, MODEL_NAME, PROMPT_VERSION)
+    with span("vision_cache_get"):
+        cached = await vision_cache.get(cache_key)
+    if cached is not None:
+        return GeminiVisionResponse(**cached), None
+
+    image_hash = None
+    with span("near_duplicate_lookup"):
+        result = await find_near_duplicate(db, image.phash)
+    barcode = None
+    if result is None and BARCODE_LOOKUP_ENABLED:
+        barcode = await read_barcode(image)
+        if barcode:
+            with span("barcode_lookup"):
+                known = await product_index.find_by_barcode(barcode, ANALYSIS_VERSION)
+            if known is not None:
+                result = GeminiVisionResponse(**known)
+    if result is None:
+        result = await get_gemini_response(image_bytes=image.data, mime_type=image.mime_type)
+        # Only fresh analyses are indexed, so near-duplicate matches cannot drift
+        image_hash = image.phash
+        if barcode:
+            # Later photos showing this code skip Gemini
+            await product_index.resolve(result.dict(), ANALYSIS_VERSION, barcode=barcode)
+    await vision_cache.set(cache_key, result.dict())
+    return result, image_hash
+
+async def analyze_scan_job(image_bytes: bytes) -> Tuple[GeminiVisionResponse, Optional[int]]:
+    """analyze_image for a background job, backing off while the Gemini limiter is saturated"""
+    for attempt in range(SCAN_JOB_MAX_ATTEMPTS):
+        try:
+            return await analyze_image(mongodb.connect(), image_bytes)
+        except HTTPException as e:
+            if e.status_code in (429, 503) and attempt + 1 < SCAN_JOB_MAX_ATTEMPTS:
+                await asyncio.sleep(2 ** attempt)
+                continue
+            raise
+
+async def process_scan_job(scan_id: ObjectId, image_bytes: bytes):
+    """Background worker handler: analyze the image and complete the job document in place"""
+    history = get_collection("history")
     try:
-        data = json.loads(raw)
-        return GeminiVisionResponse(**data)
+        result, image_hash = await analyze_scan_job(image_bytes)
+        result, product_id = await resolve_product(result)
+        update = {"status": "completed", "response": history_response(result, product_id), "completed_at": datetime.utcnow()}
+        if product_id:
+            update["product_id"] = product_id
+        if image_hash is not None:
+            update["phash"] = hash_to_hex(image_hash)
+        job = await history.find_one_and_update(
+            {"_id": scan_id},
+            {"$set": update, "$unset": {"image": ""}},
+            projection={"user_id": 1, "timestamp": 1, "response": 1},
+            return_document=ReturnDocument.AFTER
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse Gemini response: {e}. Raw response: {raw}")
+        # Whatever failed before the result was stored, the job must not stay pending
+        await history.update_one(
+            {"_id": scan_id},
+            {"$set": {"status": "failed", "error": e.detail if isinstance(e, HTTPException) else str(e)}, "$unset": {"image": ""}}
+        )
+        return
+
+    if job:
+        await on_scans_stored([job])
+    if image_hash is not None:
+        near_duplicate_index.add(image_hash, str(scan_id))
 
-@router.post("/vision", response_model=GeminiVisionResponse)
+@router.post("/vision", response_model=GeminiVisionResponse, responses={202: {"model": ScanJobResponse}})
 async def gemini_vision(
+    response: Response,
     file: UploadFile = File(...),
     user_id: str = None,  # You may want to use Depends(get_current_user) for real auth
+    job: bool = False,  # Return a scan id immediately and analyze in the background
     db=Depends(get_database)
 ):
     try:
         img_bytes = await file.read()
-        result = await get_gemini_response(image_bytes=img_bytes)
+        if job:
+            scan_jobs.check_capacity()
+            # The job record becomes the history entry once the worker completes it
+            job_doc = {
+                "user_id": user_id,
+                "status": "pending",
+                "timestamp": datetime.utcnow()
+            }
+            if scan_jobs.stores_image():
+                job_doc["image"] = Binary(img_bytes)
+            insert_result = await db['history'].insert_one(job_doc)
+            try:
+                await scan_jobs.submit(insert_result.inserted_id, img_bytes)
+            except Exception as e:
+                # Nothing will pick the job up, so it must not stay pending
+                await db['history'].update_one(
+                    {"_id": insert_result.inserted_id},
+                    {"$set": {"status": "failed", "error": e.detail if isinstance(e, HTTPException) else str(e)}, "$unset": {"image": ""}}
+                )
+                raise
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={"scan_id": str(insert_result.inserted_id), "status": "pending"}
+            )
+
+        result, image_hash = await analyze_image(db, img_bytes, response)
+        result, product_id = await resolve_product(result)
         # Store the result in the 'history' collection
-        history_doc = {
-            "user_id": user_id,
-            "response": result.dict(),
-            "timestamp": __import__('datetime').datetime.utcnow()
-        }
-        db['history'].insert_one(history_doc)
+        history_doc = make_history_doc(user_id, result, image_hash, product_id)
+        insert_result = await db['history'].insert_one(history_doc)
+        await on_scans_stored([history_doc])
+        if image_hash is not None:
+            near_duplicate_index.add(image_hash, str(insert_result.inserted_id))
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+async def analyze_merged(images: List[PreprocessedImage]) -> GeminiVisionResponse:
+    """One Gemini call for several photos of the same product"""
+    cache_key = vision_cache.make_key(
+        b"".join(image.data for image in images), MODEL_NAME, f"{PROMPT_VERSION}:merge"
+    )
+    cached = await vision_cache.get(cache_key)
+    if cached is not None:
+        return GeminiVisionResponse(**cached)
+    first, rest = images[0], images[1:]
+    result = await get_gemini_response(
+        image_bytes=first.data,
+        mime_type=first.mime_type,
+        extra_images=[(image.data, image.mime_type) for image in rest]
+    )
+    await vision_cache.set(cache_key, result.dict())
+    return result
+
+@router.post("/vision/batch", response_model=BatchVisionResponse)
+async def gemini_vision_batch(
+    files: List[UploadFile] = File(...),
+    user_id: str = None,
+    mode: str = "merge",  # "merge": one product from several photos, "fanout": one analysis per photo
+    db=Depends(get_database)
+):
+    if mode not in ("merge", "fanout"):
+        raise HTTPException(status_code=400, detail="mode must be 'merge' or 'fanout'")
+    if not files or len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Upload between 1 and {BATCH_MAX_IMAGES} images")
+    try:
+        file_names = [file.filename for file in files]
+        uploads = [await file.read() for file in files]
+
+        if mode == "merge":
+            images = await asyncio.gather(*(prepare_image(img_bytes) for img_bytes in uploads))
+            result, product_id = await resolve_product(await analyze_merged(list(images)))
+            history_doc = make_history_doc(user_id, result, product_id=product_id)
+            insert_result = await db['history'].insert_one(history_doc)
+            await on_scans_stored([history_doc])
+            items = [BatchScanItem(file_names=file_names, scan_id=str(insert_result.inserted_id), result=result)]
+            return BatchVisionResponse(mode=mode, results=items)
+
+        semaphore = asyncio.Semaphore(BATCH_MAX_PARALLEL)
+
+        async def analyze_one(img_bytes: bytes):
+            async with semaphore:
+                result, image_hash = await analyze_image(db, img_bytes)
+            result, product_id = await resolve_product(result)
+            return result, image_hash, product_id
+
+        outcomes = await asyncio.gather(*(analyze_one(img_bytes) for img_bytes in uploads), return_exceptions=True)
+        items = []
+        history_docs = []
+        image_hashes = []
+        for file_name, outcome in zip(file_names, outcomes):
+            if isinstance(outcome, BaseException):
+                detail = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+                items.append(BatchScanItem(file_names=[file_name], error=detail))
+                continue
+            result, image_hash, product_id = outcome
+            items.append(BatchScanItem(file_names=[file_name], result=result))
+            history_docs.append(make_history_doc(user_id, result, image_hash, product_id))
+            image_hashes.append(image_hash)
+
+        if history_docs:
+            # One round trip for every successful scan in the batch
+            insert_result = await db['history'].insert_many(history_docs)
+            await on_scans_stored(history_docs)
+            successful = [item for item in items if item.result is not None]
+            for item, scan_id, image_hash in zip(successful, insert_result.inserted_ids, image_hashes):
+                item.scan_id = str(scan_id)
+                if image_hash is not None:
+                    near_duplicate_index.add(image_hash, str(scan_id))
+        return BatchVisionResponse(mode=mode, results=items)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_scan_job(db, scan_id: str) -> Dict[str, Any]:
+    if not ObjectId.is_valid(scan_id):
+        raise HTTPException(status_code=404, detail="Scan not found")
+    doc = await db['history'].find_one(
+        {"_id": ObjectId(scan_id)},
+        {"status": 1, "response": 1, "product_id": 1, "error": 1}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    await product_index.hydrate([doc])
+    return {
+        "scan_id": scan_id,
+        # Synchronous scans have no status field and are always complete
+        "status": doc.get("status", "completed"),
+        "result": doc.get("response"),
+        "error": doc.get("error")
+    }
+
+@router.get("/vision/jobs/{scan_id}", response_model=ScanJobResponse)
+async def get_scan_job_status(scan_id: str, db=Depends(get_database)):
+    """Poll a scan job for its status and result"""
+    return await get_scan_job(db, scan_id)
+
+@router.get("/vision/jobs/{scan_id}/events")
+async def stream_scan_job_events(scan_id: str, db=Depends(get_database)):
+    """Server-sent events: status updates until the scan job completes or fails, or the stream times out"""
+    job_state = await get_scan_job(db, scan_id)
+
+    async def events():
+        state = job_state
+        last_status = None
+        deadline = time.monotonic() + SCAN_JOB_EVENTS_TIMEOUT_SECONDS
+        while True:
+            if state["status"] != last_status:
+                last_status = state["status"]
+                yield f"event: {last_status}\ndata: {json.dumps(state)}\n\n"
+            if last_status in ("completed", "failed"):
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Clients can keep polling /vision/jobs/{scan_id} if they still care
+                yield f"event: timeout\ndata: {json.dumps(state)}\n\n"
+                return
+            await scan_jobs.wait(scan_id, timeout=min(SCAN_JOB_EVENTS_POLL_SECONDS, remaining))
+            state = await get_scan_job(db, scan_id)
+            if state["status"] == last_status:
+                # Keep proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,32 +1,162 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from app.database.mongodb import get_database
-from typing import List
-from datetime import datetime, timezone, timedelta
+from app.services.scan_jobs import COMPLETED_SCAN_FILTER
+from app.routes.genai import GeminiVisionResponse
+from app.services.json_response import FastJSONResponse, dumps
+from app.services.history import history_etag, etag_matches
+from app.services.products import product_index
+from typing import List, Optional, Dict, Any
+from datetime import datetime
+from bson import ObjectId
+import base64
+import json
+import zlib
 
 router = APIRouter()
 
-# IST timezone (UTC+5:30)
-IST = timezone(timedelta(hours=5, minutes=30))
+# Page size limits for /history
+HISTORY_DEFAULT_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+# Documents fetched per cursor batch and written per chunk by /history/export
+EXPORT_BATCH_SIZE = 200
+# Internal scan fields (near-duplicate hash, scan job bookkeeping) left out of every history response
+HISTORY_PROJECTION = {"phash": 0, "status": 0, "started_at": 0, "completed_at": 0}
 
-def convert_utc_to_ist(utc_datetime: datetime) -> str:
-    """Convert UTC datetime to IST string"""
-    if utc_datetime.tzinfo is None:
-        # Assume UTC if no timezone info
-        utc_datetime = utc_datetime.replace(tzinfo=timezone.utc)
-    
-    ist_datetime = utc_datetime.astimezone(IST)
-    return ist_datetime.isoformat()
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past the given history document"""
+    position = {"t": doc["timestamp"].isoformat(), "id": str(doc["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
 
-@router.get("/history")
-async def get_user_history(candidate_id: str = Query(..., alias="user_id"), db=Depends(get_database)):
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Keyset condition for the documents after the cursor in (timestamp, _id) descending order"""
     try:
-        history_cursor = db["history"].find({"user_id": candidate_id}).sort("timestamp", -1)
-        history = list(history_cursor)
-        for h in history:
-            h["_id"] = str(h["_id"])  # Convert ObjectId to string for JSON serialization
-            # Convert timestamp to IST
-            if h.get("timestamp"):
-                h["timestamp"] = convert_utc_to_ist(h["timestamp"])
-        return {"history": history}
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp = datetime.fromisoformat(position["t"])
+        last_id = ObjectId(position["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": last_id}}
+    ]}
+
+def build_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Projection for a comma-separated list of response fields (plus timestamp)"""
+    if not fields:
+        return None
+    projection = {"timestamp": 1}
+    for field in (f.strip() for f in fields.split(",")):
+        if not field or field == "timestamp":
+            continue
+        if field not in GeminiVisionResponse.model_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {field}")
+        projection[f"response.{field}"] = 1
+        # Needed to fill in fields kept on the shared product
+        projection["product_id"] = 1
+    return projection
+
+def response_fields(projection: Optional[Dict[str, int]]) -> Optional[List[str]]:
+    """Response fields selected by a projection, or None for all of them"""
+    if projection is None:
+        return None
+    return [key.split(".", 1)[1] for key in projection if key.startswith("response.")]
+
+async def hydrate_history(docs: List[Dict[str, Any]], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Fill in the product analyses of history documents, then drop their internal product_id"""
+    # product_id cannot be projected out: hydrate needs it
+    await product_index.hydrate(docs, fields)
+    for doc in docs:
+        doc.pop("product_id", None)
+    return docs
+
+@router.get("/history", response_class=FastJSONResponse)
+async def get_user_history(
+    request: Request,
+    candidate_id: str = Query(..., alias="user_id"),
+    limit: int = Query(HISTORY_DEFAULT_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,  # next_cursor from the previous page
+    fields: Optional[str] = None,  # e.g. "product_name,rating,timestamp"
+    db=Depends(get_database)
+):
+    try:
+        # Unchanged history: answer from the newest-scan lookup alone
+        etag = await history_etag(db, candidate_id)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        query = {"user_id": candidate_id, **COMPLETED_SCAN_FILTER}
+        if cursor:
+            query.update(decode_cursor(cursor))
+        projection = build_projection(fields)
+        # Fetch one extra document to know whether another page exists
+        history = await db["history"].find(query, projection or HISTORY_PROJECTION).sort(
+            [("timestamp", -1), ("_id", -1)]
+        ).limit(limit + 1).to_list(length=None)
+        next_cursor = encode_cursor(history[limit - 1]) if len(history) > limit else None
+        # Documents go out as stored, plus their product analysis; FastJSONResponse converts ObjectIds and timestamps
+        return FastJSONResponse({
+            "history": await hydrate_history(history[:limit], response_fields(projection)),
+            "next_cursor": next_cursor
+        }, headers={"ETag": etag})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def iter_ndjson(cursor, compress: bool):
+    """Encode a history cursor as NDJSON chunks, one cursor batch at a time"""
+    # wbits=31 produces a gzip container rather than a raw zlib stream
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    batch = []
+    async for h in cursor:
+        batch.append(h)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            # One product lookup per batch at most
+            await hydrate_history(batch)
+            chunk = b"\n".join(dumps(doc) for doc in batch) + b"\n"
+            batch = []
+            yield compressor.compress(chunk) if compressor else chunk
+    await hydrate_history(batch)
+    chunk = b"\n".join(dumps(doc) for doc in batch) + b"\n" if batch else b""
+    if compressor:
+        yield compressor.compress(chunk) + compressor.flush()
+    elif chunk:
+        yield chunk
+
+@router.get("/history/export")
+async def export_user_history(
+    candidate_id: str = Query(..., alias="user_id"),
+    gzip: bool = False,
+    db=Depends(get_database)
+):
+    """Stream a user's complete history as NDJSON, one scan per line"""
+    cursor = db["history"].find(
+        {"user_id": candidate_id, **COMPLETED_SCAN_FILTER},
+        HISTORY_PROJECTION
+    ).sort([("timestamp", -1), ("_id", -1)]).batch_size(EXPORT_BATCH_SIZE)
+    headers = {"Content-Disposition": f'attachment; filename="history-{candidate_id}.ndjson"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(iter_ndjson(cursor, gzip), media_type="application/x-ndjson", headers=headers)
+
+@router.get("/history/{scan_id}", response_class=FastJSONResponse)
+async def get_history_item(
+    scan_id: str,
+    candidate_id: str = Query(..., alias="user_id"),
+    db=Depends(get_database)
+):
+    """Full details of a single scan"""
+    if not ObjectId.is_valid(scan_id):
+        raise HTTPException(status_code=404, detail="Scan not found")
+    try:
+        scan = await db["history"].find_one(
+            {"_id": ObjectId(scan_id), "user_id": candidate_id, **COMPLETED_SCAN_FILTER},
+            HISTORY_PROJECTION
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not scan:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    await hydrate_history([scan])
+    return FastJSONResponse(scan)
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from app.schemas.profile import UserProfileCreate, UserProfileResponse, UserProfileUpdate
 from app.services.profile import create_user_profile, get_user_profile, update_user_profile
+from app.services.history import etag_matches
 
 router = APIRouter()
 
@@ -23,14 +24,23 @@ async def create_profile(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def profile_etag(profile: dict) -> str:
+    """ETag derived from the profile's last update time"""
+    return f'"{profile.get("updated_at") or profile.get("created_at") or ""}"'
+
 @router.get("/profile/{user_id}", response_model=UserProfileResponse)
-async def get_profile(user_id: str):
+async def get_profile(user_id: str, request: Request, response: Response):
     """Get user profile information"""
     try:
         profile = await get_user_profile(user_id)
         if not profile:
             raise HTTPException(status_code=404, detail="Profile not found")
         
+        etag = profile_etag(profile)
+        # Clients holding the current version get an empty 304
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
         return profile
     except HTTPException:
         raise
@@ -0,0 +1,45 @@
+from fastapi import APIRouter
+from app.database.mongodb import mongodb
+from app.services.vision_cache import vision_cache
+from app.services.phash import near_duplicate_index
+from app.services.limiter import gemini_limiter
+from app.services.auth import password_limiter
+from app.services.profile_cache import profile_cache
+from app.services.products import product_index
+
+router = APIRouter()
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """Connection pool statistics for the shared MongoDB client"""
+    return mongodb.get_pool_stats()
+
+@router.get("/vision-cache")
+async def get_vision_cache_stats():
+    """Hit/miss counters for the /genai/vision result cache"""
+    return vision_cache.get_stats()
+
+@router.get("/near-duplicates")
+async def get_near_duplicate_stats():
+    """Size and hit counters of the perceptual-hash scan index"""
+    return near_duplicate_index.get_stats()
+
+@router.get("/gemini-limiter")
+async def get_gemini_limiter_stats():
+    """Concurrency, queue depth and rejections in front of the Gemini API"""
+    return gemini_limiter.get_stats()
+
+@router.get("/password-hashing")
+async def get_password_hashing_stats():
+    """Load on the bcrypt worker pool"""
+    return password_limiter.get_stats()
+
+@router.get("/profile-cache")
+async def get_profile_cache_stats():
+    """Hit ratio of the user profile cache"""
+    return profile_cache.get_stats()
+
+@router.get("/products")
+async def get_product_index_stats():
+    """Hit ratio of the in-memory hot product index"""
+    return product_index.get_stats()
@@ -0,0 +1,133 @@
+"""Scan alerts, derived once when a scan is stored.
+
+Each scan that trips an alert rule gets one consolidated document in the
+alerts collection, keyed by the scan id. After changing the rules below,
+re-derive every stored alert from history with:
+
+    python -m app.services.alerts
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+from pymongo import ReplaceOne
+from app.database.mongodb import get_collection, run_script
+from app.services.scan_jobs import COMPLETED_SCAN_FILTER
+from app.services.history_versions import bump_history_versions
+
+# Higher ranks sort first
+SEVERITY_RANKS = {"high": 3, "medium": 2, "low": 1}
+
+def derive_alert(response_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Consolidated alert for a scan result, or None if nothing is concerning"""
+    product_name = response_data.get("product_name", "Unknown Product")
+
+    # Collect all concerns for this product
+    alert_messages = []
+    alert_types = []
+    max_severity = "low"
+
+    # Check for poor rating
+    rating = response_data.get("rating", "").lower()
+    if rating == "poor":
+        alert_messages.append("📉 Poor nutritional rating")
+        alert_types.append("poor_rating")
+        max_severity = "high"
+
+    # Check for high concerns
+    concerns = response_data.get("concerns", 0)
+    if concerns >= 3:
+        alert_messages.append(f"🚨 {concerns} ingredient concerns")
+        alert_types.append("high_concerns")
+        if concerns >= 5:
+            max_severity = "high"
+        elif max_severity != "high":
+            max_severity = "medium"
+
+    # Check for highly processed foods
+    processing_level = response_data.get("processing_level", "").lower()
+    if processing_level == "highly_processed":
+        alert_messages.append("🏭 Highly processed")
+        alert_types.append("highly_processed")
+        if max_severity == "low":
+            max_severity = "medium"
+
+    # Check for allergens
+    allergens = response_data.get("allergens", [])
+    if allergens:
+        alert_messages.append(f"⚠️ Contains allergens: {', '.join(allergens)}")
+        alert_types.append("allergen_warning")
+        max_severity = "high"
+
+    # If no alerts, there is nothing to store
+    if not alert_messages:
+        return None
+
+    return {
+        "product_name": product_name,
+        "alert_type": "_".join(alert_types),
+        "alert_message": f"{product_name} - " + " | ".join(alert_messages),
+        "severity": max_severity
+    }
+
+def build_alert_doc(scan: Dict[str, Any], derived_at: datetime) -> Optional[Dict[str, Any]]:
+    """Alert document for a stored history document, keyed by the scan id"""
+    alert = derive_alert(scan.get("response") or {})
+    if alert is None:
+        return None
+    return {
+        "_id": scan["_id"],
+        "alert_id": f"{scan['_id']}_{alert['alert_type']}",
+        "user_id": scan["user_id"],
+        "scan_id": str(scan["_id"]),
+        "severity_rank": SEVERITY_RANKS[alert["severity"]],
+        "timestamp": scan.get("timestamp"),
+        "derived_at": derived_at,
+        **alert
+    }
+
+async def record_scan_alerts(scans: Iterable[Dict[str, Any]]):
+    """Store alerts for newly stored history documents"""
+    now = datetime.utcnow()
+    docs = [build_alert_doc(scan, now) for scan in scans if scan.get("user_id")]
+    writes = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs if doc]
+    if writes:
+        await get_collection("alerts").bulk_write(writes, ordered=False)
+
+async def rederive_alerts(db) -> int:
+    """Recompute every stored alert from history with the current rules"""
+    started = datetime.utcnow()
+    alerts = db["alerts"]
+    cursor = db["history"].find(
+        {"user_id": {"$ne": None}, **COMPLETED_SCAN_FILTER},
+        {
+            "user_id": 1,
+            "timestamp": 1,
+            "response.product_name": 1,
+            "response.rating": 1,
+            "response.concerns": 1,
+            "response.processing_level": 1,
+            "response.allergens": 1
+        }
+    )
+    derived = 0
+    batch = []
+    user_ids = set()
+    async for scan in cursor:
+        user_ids.add(scan["user_id"])
+        doc = build_alert_doc(scan, started)
+        if doc is None:
+            continue
+        batch.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        if len(batch) >= 1000:
+            await alerts.bulk_write(batch, ordered=False)
+            derived += len(batch)
+            batch = []
+    if batch:
+        await alerts.bulk_write(batch, ordered=False)
+        derived += len(batch)
+    # Scans that no longer raise an alert under the current rules
+    await alerts.delete_many({"derived_at": {"$lt": started}})
+    await bump_history_versions(user_ids)
+    return derived
+
+if __name__ == "__main__":
+    print(f"Derived {run_script(rederive_alerts)} alerts")
@@ -1,36 +1,74 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.database.mongodb import MongoDB
+from pymongo.errors import DuplicateKeyError
+from app.database.mongodb import get_collection
+from app.services.limiter import ConcurrencyLimiter
+from app.services.metrics import span
 
 # to get a string like this run: openssl rand -hex 32
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# In-process cache of authenticated user lookups
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+# Tokens younger than this are trusted to carry the user's id and name, skipping the lookup (0 disables)
+TOKEN_CLAIMS_TRUST_SECONDS = int(os.getenv("TOKEN_CLAIMS_TRUST_SECONDS", "60"))
+
+# bcrypt cost factor; hashes with a different cost are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads dedicated to bcrypt (it releases the GIL), and how many requests may wait for one
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS", "10"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Password hashing runs here, off the event loop, with back-pressure when the pool is saturated
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+password_limiter = ConcurrencyLimiter(
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_QUEUE,
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+    busy_detail="Too many sign-ins in progress, please retry shortly"
+)
 
 # OAuth2 scheme for token extraction
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+# Principals resolved by get_current_user, keyed by email (the token's "sub")
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_user(email: str):
+    """Drop a cached user; call whenever a user document changes"""
+    user_cache.pop(email, None)
+
 # Get user function for database lookup
 async def get_user(email: str):
-    db = MongoDB()
-    try:
-        users = db.get_collection("users")
-        user = users.find_one({"email": email})
-        if user:
-            return {
-                "email": user["email"],
-                "name": user["name"],
-                "hashed_password": user["hashed_password"],
-                "_id": str(user["_id"])
-            }
-        return None
-    finally:
-        db.close()
+    users = get_collection("users")
+    with span("auth_user_lookup"):
+        user = await users.find_one({"email": email})
+    if user:
+        return {
+            "email": user["email"],
+            "name": user["name"],
+            "hashed_password": user["hashed_password"],
+            "_id": str(user["_id"])
+        }
+    return None
+
+def user_principal(email: str, name: str, user_id: str) -> dict:
+    """What get_current_user returns, whether from the token, the cache or the database; never the password hash"""
+    return {"email": email, "name": name, "_id": user_id}
 
 # Dummy TokenData class (replace with your schema)
 class TokenData:
@@ -40,41 +78,44 @@ class TokenData:
 # Implement authentication logic here
 
 async def register_user(email: str, name: str, password: str):
-    db = MongoDB()
-    users = db.get_collection("users")
-    # Check if user already exists
-    if users.find_one({"email": email}):
-        db.close()
-        raise Exception("User already exists")
-    hashed_password = get_password_hash(password)
+    users = get_collection("users")
+    hashed_password = await hash_password_async(password)
     user_doc = {"email": email, "name": name, "hashed_password": hashed_password}
-    result = users.insert_one(user_doc)
+    # The unique index on users.email rejects existing users
+    try:
+        result = await users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise Exception("User already exists")
+    invalidate_user(email)
     
     # Create JWT token for the new user
+    user_id = str(result.inserted_id)
     access_token = create_access_token(
-        data={"sub": email},
+        data={"sub": email, "uid": user_id, "name": name},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    user_id = str(result.inserted_id)
-    db.close()
     return access_token, user_id
 
 async def login_user(email: str, password: str):
-    db = MongoDB()
-    users = db.get_collection("users")
-    user = users.find_one({"email": email})
-    db.close()
+    users = get_collection("users")
+    with span("auth_user_lookup"):
+        user = await users.find_one({"email": email})
     if not user:
         raise Exception("Invalid email or password")
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password_async(password, user["hashed_password"]):
         raise Exception("Invalid email or password")
+    if pwd_context.needs_update(user["hashed_password"]):
+        # The configured cost factor changed since this hash was made
+        new_hash = await hash_password_async(password)
+        await users.update_one({"_id": user["_id"]}, {"$set": {"hashed_password": new_hash}})
+        invalidate_user(email)
+    user_id = str(user.get("_id"))
+    user_name = user.get("name")
     # Create JWT token
     access_token = create_access_token(
-        data={"sub": user["email"]},
+        data={"sub": user["email"], "uid": user_id, "name": user_name},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    user_id = str(user.get("_id"))
-    user_name = user.get("name")
     return access_token, user_id, user_name
 
 def verify_password(plain_password, hashed_password):
@@ -83,13 +124,24 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def _run_password_task(func, *args):
+    with span(f"auth_{func.__name__}"):
+        async with password_limiter.slot():
+            return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password):
+    return await _run_password_task(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -107,7 +159,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = await get_user(email=token_data.email)
-    if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+    # A freshly issued token already carries what routes need
+    issued_at = payload.get("iat")
+    if (
+        TOKEN_CLAIMS_TRUST_SECONDS
+        and payload.get("uid")
+        and issued_at
+        and time.time() - issued_at < TOKEN_CLAIMS_TRUST_SECONDS
+    ):
+        return user_principal(email, payload.get("name"), payload["uid"])
+    principal = user_cache.get(token_data.email)
+    if principal is None:
+        user = await get_user(email=token_data.email)
+        if user is None:
+            raise credentials_exception
+        principal = user_principal(user["email"], user["name"], user["_id"])
+        user_cache[token_data.email] = principal
+    return principal
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""EAN-13 / UPC-A / EAN-8 barcode reader for packaging photos.
+
+Pure Python on top of Pillow: the image is averaged into horizontal bands,
+each band is thresholded into bar/space run lengths, and the runs are matched
+against the EAN module patterns. Both orientations and both reading
+directions are tried. A code is only returned when it passes the check digit
+and is read identically on at least BARCODE_MIN_AGREEING_ROWS bands, since a
+misread would attach the wrong product.
+
+A photo without a barcode costs every band in both orientations (tens of
+milliseconds), so genai.read_barcode runs the decoder off the event loop.
+"""
+import io
+import os
+from collections import Counter
+from typing import List, Optional
+from PIL import Image
+
+# Horizontal bands sampled per orientation
+BARCODE_SCAN_BANDS = int(os.getenv("BARCODE_SCAN_BANDS", "40"))
+BARCODE_MIN_AGREEING_ROWS = int(os.getenv("BARCODE_MIN_AGREEING_ROWS", "2"))
+# Wider images are downscaled first; a full EAN-13 needs roughly 2px per module
+BARCODE_MAX_WIDTH = int(os.getenv("BARCODE_MAX_WIDTH", "1200"))
+
+# Module widths (space, bar, space, bar) of the left-hand odd-parity "L" codes.
+# Right-hand "R" codes have the same widths starting with a bar, and
+# even-parity "G" codes are the L widths reversed.
+L_PATTERNS = [
+    (3, 2, 1, 1), (2, 2, 2, 1), (2, 1, 2, 2), (1, 4, 1, 1), (1, 1, 3, 2),
+    (1, 2, 3, 1), (1, 1, 1, 4), (1, 3, 1, 2), (1, 2, 1, 3), (3, 1, 1, 2),
+]
+G_PATTERNS = [tuple(reversed(p)) for p in L_PATTERNS]
+
+# L/G parity of the six left digits encodes the leading EAN-13 digit
+FIRST_DIGIT_PARITY = {
+    "LLLLLL": 0, "LLGLGG": 1, "LLGGLG": 2, "LLGGGL": 3, "LGLLGG": 4,
+    "LGGLLG": 5, "LGGGLL": 6, "LGLGLG": 7, "LGLGGL": 8, "LGGLGL": 9,
+}
+
+# Largest summed deviation, in modules, accepted for a digit, and per guard bar/space
+MAX_DIGIT_ERROR = 1.6
+MAX_GUARD_ERROR = 0.7
+# A digit must span 7 modules give or take this much
+MAX_DIGIT_SPAN_ERROR = 2.0
+# Quiet zone before the start guard, in modules (the spec asks for 7+)
+MIN_QUIET_ZONE = 4
+
+def check_digit_ok(digits: List[int]) -> bool:
+    """GTIN check digit: weights 3,1,3,... from the right, excluding the check digit"""
+    body, check = digits[:-1], digits[-1]
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(body)))
+    return (10 - total % 10) % 10 == check
+
+def _match_digit(widths: List[int], patterns, module: float) -> Optional[tuple]:
+    """(digit, error) of the closest pattern for four runs spanning 7 modules"""
+    if abs(sum(widths) / module - 7) > MAX_DIGIT_SPAN_ERROR:
+        return None
+    module = sum(widths) / 7
+    best = None
+    for digit, pattern in enumerate(patterns):
+        error = sum(abs(w / module - p) for w, p in zip(widths, pattern))
+        if best is None or error < best[1]:
+            best = (digit, error)
+    return best if best[1] <= MAX_DIGIT_ERROR else None
+
+def _guard_ok(widths: List[int], module: float) -> bool:
+    return all(abs(w / module - 1) <= MAX_GUARD_ERROR for w in widths)
+
+def _decode_at(runs: List[int], start: int, left_digits: int) -> Optional[str]:
+    """Decode an EAN-13 (left_digits=6) or EAN-8 (4) symbol whose start guard begins at runs[start]"""
+    needed = 3 + left_digits * 4 * 2 + 5 + 3
+    if start + needed > len(runs):
+        return None
+    # 3 + 7 per digit + 5 + 3 modules in total
+    module = sum(runs[start:start + needed]) / (11 + left_digits * 14)
+    if not _guard_ok(runs[start:start + 3], module):
+        return None
+    if start > 0 and runs[start - 1] < MIN_QUIET_ZONE * module:
+        return None
+
+    pos = start + 3
+    digits = []
+    parity = ""
+    for _ in range(left_digits):
+        widths = runs[pos:pos + 4]
+        left = _match_digit(widths, L_PATTERNS, module)
+        even = _match_digit(widths, G_PATTERNS, module) if left_digits == 6 else None
+        if left and (not even or left[1] <= even[1]):
+            digits.append(left[0])
+            parity += "L"
+        elif even:
+            digits.append(even[0])
+            parity += "G"
+        else:
+            return None
+        pos += 4
+
+    if not _guard_ok(runs[pos:pos + 5], module):
+        return None
+    pos += 5
+    for _ in range(left_digits):
+        # R codes share the L widths, read from a bar instead of a space
+        right = _match_digit(runs[pos:pos + 4], L_PATTERNS, module)
+        if not right:
+            return None
+        digits.append(right[0])
+        pos += 4
+    if not _guard_ok(runs[pos:pos + 3], module):
+        return None
+
+    if left_digits == 6:
+        first = FIRST_DIGIT_PARITY.get(parity)
+        if first is None:
+            return None
+        digits.insert(0, first)
+    if not check_digit_ok(digits):
+        return None
+    return "".join(map(str, digits))
+
+def _row_runs(row: bytes) -> Optional[tuple]:
+    """Run lengths of a thresholded row, and whether the first run is dark"""
+    low, high = min(row), max(row)
+    if high - low < 48:
+        return None  # no contrast, nothing to read
+    threshold = (low + high) // 2
+    runs = []
+    dark = row[0] < threshold
+    first_dark = dark
+    length = 0
+    for value in row:
+        if (value < threshold) == dark:
+            length += 1
+        else:
+            runs.append(length)
+            dark = not dark
+            length = 1
+    runs.append(length)
+    return runs, first_dark
+
+def _decode_row(row: bytes) -> Optional[str]:
+    parsed = _row_runs(row)
+    if parsed is None:
+        return None
+    runs, first_dark = parsed
+    # Reversed runs read an upside-down symbol; the last run is dark if the first
+    # one is and the count is odd, or if the first one is light and it is even
+    last_dark = first_dark if len(runs) % 2 == 1 else not first_dark
+    for candidate, dark_first in ((runs, first_dark), (runs[::-1], last_dark)):
+        first_bar = 0 if dark_first else 1
+        for start in range(first_bar, len(candidate), 2):
+            code = _decode_at(candidate, start, 6) or _decode_at(candidate, start, 4)
+            if code:
+                return code
+    return None
+
+def _band_rows(img: Image.Image) -> List[bytes]:
+    width, height = img.size
+    bands = min(BARCODE_SCAN_BANDS, height)
+    # BOX resampling averages each band vertically, which smooths noise along the bars
+    reduced = img.resize((width, bands), Image.Resampling.BOX)
+    data = reduced.tobytes()
+    return [data[i * width:(i + 1) * width] for i in range(bands)]
+
+def decode_barcode(image_bytes: bytes) -> Optional[str]:
+    """The EAN-13 or EAN-8 code visible in a photo, or None; UPC-A reads as EAN-13 with a leading 0"""
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft("L", (BARCODE_MAX_WIDTH, BARCODE_MAX_WIDTH))
+    img = img.convert("L")
+    if img.width > BARCODE_MAX_WIDTH:
+        img = img.resize((BARCODE_MAX_WIDTH, round(img.height * BARCODE_MAX_WIDTH / img.width)))
+
+    for oriented in (img, img.transpose(Image.Transpose.ROTATE_90)):
+        reads = Counter(code for code in map(_decode_row, _band_rows(oriented)) if code)
+        if reads:
+            code, count = reads.most_common(1)[0]
+            if count >= BARCODE_MIN_AGREEING_ROWS:
+                return code
+    return None
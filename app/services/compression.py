@@ -0,0 +1,106 @@
+"""Negotiated gzip/brotli compression for single-body responses.
+
+Brotli is used when the optional ``brotli`` package is installed and the
+client accepts it; otherwise gzip. Streaming responses (SSE, NDJSON export)
+and bodies below the size threshold pass through untouched.
+"""
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Low qualities keep brotli cheaper than gzip while still compressing better
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported encoding the client accepts (q > 0), if any"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete response bodies above a size threshold"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                response_headers = dict(message.get("headers", []))
+                # Already encoded (e.g. the gzip history export) or event streams: leave alone
+                if b"content-encoding" in response_headers or response_headers.get(b"content-type", b"").startswith(b"text/event-stream"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or small: send the original response as-is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            response_headers = [
+                (name, value) for name, value in start_message.get("headers", [])
+                if name.lower() != b"content-length"
+            ]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
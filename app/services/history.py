@@ -0,0 +1,40 @@
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional
+from app.services.alerts import record_scan_alerts
+from app.services.scan_stats import record_scan_stats
+from app.services.history_versions import bump_history_versions, get_history_version
+
+logger = logging.getLogger(__name__)
+
+async def on_scans_stored(scans: Iterable[Dict[str, Any]]):
+    """Update everything derived from newly stored history documents.
+
+    Failures are logged rather than raised, since the scans themselves are
+    already stored; the rebuild commands (scan_stats, alerts) repair drift.
+    The users' history versions change last, once the derived data is written.
+    """
+    scans = list(scans)
+    results = await asyncio.gather(record_scan_stats(scans), record_scan_alerts(scans), return_exceptions=True)
+    for derived, result in zip(("daily scan stats", "scan alerts"), results):
+        if isinstance(result, Exception):
+            logger.error("Could not update %s", derived, exc_info=result)
+    try:
+        await bump_history_versions(scan.get("user_id") for scan in scans)
+    except Exception:
+        logger.exception("Could not update history versions")
+
+async def history_etag(db, user_id: str, *extra: str) -> str:
+    """Weak ETag for views of a user's history: one _id lookup of the user's history version"""
+    version = await get_history_version(db, user_id)
+    return 'W/"' + "-".join([version, *extra]) + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(
+        tag.strip() == "*" or tag.strip().removeprefix("W/") == opaque
+        for tag in if_none_match.split(",")
+    )
@@ -0,0 +1,26 @@
+"""Per-user versions of everything shown in history and dashboard views.
+
+A user's version changes only after a scan and everything derived from it
+(rollups, alerts) are stored, so a view cached under the old ETag cannot
+outlive the write. Versions are fresh ObjectIds rather than counters, so an
+old version cannot come back after the collection is dropped.
+"""
+from typing import Iterable, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.database.mongodb import get_collection
+
+async def bump_history_versions(user_ids: Iterable[Optional[str]]):
+    """Invalidate the cached views of these users; call after their history or derived data changes"""
+    updates = [
+        UpdateOne({"_id": user_id}, {"$set": {"version": ObjectId()}}, upsert=True)
+        for user_id in set(user_ids)
+        if user_id
+    ]
+    for offset in range(0, len(updates), 1000):
+        await get_collection("history_versions").bulk_write(updates[offset:offset + 1000], ordered=False)
+
+async def get_history_version(db, user_id: str) -> str:
+    doc = await db["history_versions"].find_one({"_id": user_id})
+    # Nothing has changed for this user since versions were introduced
+    return str(doc["version"]) if doc else "initial"
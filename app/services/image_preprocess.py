@@ -0,0 +1,76 @@
+import io
+import os
+import time
+from PIL import Image, ImageOps
+from pydantic import BaseModel
+from app.services.phash import dhash_image
+
+# Long edge cap in pixels; label text stays legible well below phone camera resolution
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+# "JPEG" or "WEBP"
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+
+# EXIF orientation; 1 means the pixels are already upright
+ORIENTATION_TAG = 0x0112
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+# Upload formats Gemini accepts as-is when re-encoding would not make them smaller
+PASSTHROUGH_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+class PreprocessedImage(BaseModel):
+    data: bytes
+    mime_type: str
+    phash: int
+    original_bytes: int
+    processed_bytes: int
+    elapsed_ms: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.processed_bytes
+
+def preprocess_image(image_bytes: bytes) -> PreprocessedImage:
+    """Downscale, re-encode and strip metadata from an upload.
+
+    Uploads that need no resizing or rotation keep their original bytes when
+    the re-encode would not be smaller, avoiding a second lossy encode.
+
+    CPU bound, so callers on the event loop should run it in the threadpool.
+    """
+    start = time.perf_counter()
+    img = Image.open(io.BytesIO(image_bytes))
+    original_format = img.format
+    unchanged = max(img.size) <= IMAGE_MAX_EDGE and img.getexif().get(ORIENTATION_TAG, 1) == 1
+    # JPEG can decode directly at 1/2, 1/4 or 1/8 scale, which is far cheaper than a full decode
+    img.draft("RGB", (IMAGE_MAX_EDGE, IMAGE_MAX_EDGE))
+    # Apply the EXIF orientation before the metadata is dropped
+    img = ImageOps.exif_transpose(img)
+
+    long_edge = max(img.size)
+    if long_edge > IMAGE_MAX_EDGE:
+        factor = long_edge // IMAGE_MAX_EDGE
+        if factor >= 2:
+            # Cheap integer box reduction before the final resample
+            img = img.reduce(factor)
+        img.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.Resampling.LANCZOS)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    # Saving without exif/icc_profile arguments leaves the metadata behind
+    output = io.BytesIO()
+    img.save(output, format=IMAGE_FORMAT, quality=IMAGE_QUALITY, optimize=True)
+    data = output.getvalue()
+    mime_type = MIME_TYPES[IMAGE_FORMAT]
+    if unchanged and original_format in PASSTHROUGH_MIME_TYPES and len(data) >= len(image_bytes):
+        data = image_bytes
+        mime_type = PASSTHROUGH_MIME_TYPES[original_format]
+
+    return PreprocessedImage(
+        data=data,
+        mime_type=mime_type,
+        phash=dhash_image(img),
+        original_bytes=len(image_bytes),
+        processed_bytes=len(data),
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 2)
+    )
@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Any
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+from pydantic import BaseModel
+from app.services.timezones import to_ist
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        # Stored timestamps are naive UTC; clients expect IST
+        return to_ist(value).isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize Mongo documents directly: ObjectIds become strings and datetimes IST ISO strings"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson, skipping FastAPI's jsonable_encoder pass.
+
+    Return an instance from a handler to send projected documents as-is.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
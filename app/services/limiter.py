@@ -0,0 +1,79 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+from fastapi import HTTPException, status
+
+# Gemini calls allowed in flight per worker
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# Requests allowed to wait for a slot before new ones are rejected with 429
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "32"))
+# How long a queued request waits for a slot before giving up with 503
+GEMINI_QUEUE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", "30"))
+
+class ConcurrencyLimiter:
+    """Semaphore with a bounded wait queue that fails fast when saturated"""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, busy_detail: str = "Service is busy, please retry shortly"):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.busy_detail = busy_detail
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._semaphore.locked():
+            # A slot is free, so this returns without suspending
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=self.busy_detail,
+                headers={"Retry-After": "5"},
+            )
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=self.busy_detail,
+                    headers={"Retry-After": "10"},
+                )
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+gemini_limiter = ConcurrencyLimiter(
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_MAX_QUEUE,
+    GEMINI_QUEUE_TIMEOUT_SECONDS,
+    busy_detail="Too many scans in progress, please retry shortly"
+)
@@ -0,0 +1,128 @@
+"""Request and stage latency histograms, exported in Prometheus text format.
+
+TimingMiddleware times every request by route template and adds a
+Server-Timing header listing the named spans recorded while handling it.
+Wrap a stage in ``with span("name"):`` to time it.
+"""
+import bisect
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds in seconds, shared by every histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Spans recorded during the current request, for the Server-Timing header
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+class Histogram:
+    """Cumulative latency histogram keyed by a fixed set of label names"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, seconds: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+request_latency = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+span_latency = Histogram(
+    "app_span_duration_seconds",
+    "Latency of named application stages",
+    ("span",)
+)
+
+@contextmanager
+def span(name: str):
+    """Time a stage into the span histogram and the current request's Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        span_latency.observe(elapsed, name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+def render_metrics() -> str:
+    lines = request_latency.render() + span_latency.render()
+    return "\n".join(lines) + "\n"
+
+def _server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    # Repeated spans (e.g. several queries) are summed into one entry
+    durations: Dict[str, float] = {}
+    for name, elapsed in spans:
+        durations[name] = durations.get(name, 0.0) + elapsed
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()]
+    entries.append(f"app;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+class TimingMiddleware:
+    """ASGI middleware recording per-route latency and adding a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        spans: List[Tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                header = _server_timing(spans, time.perf_counter() - started)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            # The router stores the matched route on the scope; unmatched paths share one label
+            route = scope.get("route")
+            request_latency.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code)
+            )
@@ -0,0 +1,107 @@
+import os
+from typing import List, Tuple, Dict, Any
+from PIL import Image
+
+# Maximum Hamming distance (out of 64 bits) for two scans to count as the same photo
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+
+HASH_SIZE = 8
+
+def dhash_image(img: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash of an image: one bit per horizontally adjacent pixel pair"""
+    img = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(img.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def hash_to_hex(value: int) -> str:
+    # Stored as a string since a 64-bit unsigned hash does not fit a BSON int64
+    return f"{value:016x}"
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes using Hamming distance"""
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value: int, item: Any):
+        node = [value, item, {}]
+        self._size += 1
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming_distance(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """All (distance, item) pairs within max_distance, closest first"""
+        if self._root is None:
+            return []
+        matches = []
+        candidates = [self._root]
+        while candidates:
+            node_value, item, children = candidates.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                matches.append((distance, item))
+            # Triangle inequality: only subtrees in this band can hold matches
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    candidates.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+class NearDuplicateIndex:
+    """Maps perceptual hashes of past scans to their history document ids"""
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        self._tree = BKTree()
+        self.hits = 0
+        self.misses = 0
+
+    async def rebuild(self, db):
+        tree = BKTree()
+        cursor = db["history"].find({"phash": {"$exists": True}}, {"phash": 1})
+        async for doc in cursor:
+            tree.add(int(doc["phash"], 16), str(doc["_id"]))
+        self._tree = tree
+
+    def add(self, value: int, history_id: str):
+        self._tree.add(value, history_id)
+
+    def find(self, value: int) -> List[str]:
+        """History ids of earlier scans within the threshold, closest first"""
+        matches = self._tree.search(value, self.max_distance)
+        if matches:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return [history_id for _, history_id in matches]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "indexed_scans": len(self._tree),
+            "max_distance": self.max_distance,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+near_duplicate_index = NearDuplicateIndex(PHASH_MAX_DISTANCE)
@@ -0,0 +1,225 @@
+"""Shared product analyses, stored once and referenced from history.
+
+A scan of a recognizable product links to one document in the products
+collection, keyed by the normalized product name and serving size and by the
+analysis version (model and prompt), with any EAN/UPC codes read from its
+photos kept as alternate keys. The scan's history document keeps only a
+summary (the fields stats, alerts and the dashboard read) plus the
+product_id; readers that need the full analysis hydrate it through an
+in-memory index of hot products. The first analysis stored for a product and
+version is canonical, so every user sees the same result; changing the model
+or prompt version starts new products rather than keeping old analyses. A scan
+whose analysis disagrees with the canonical one on what users are warned about
+(allergens, concerns, rating, category, processing level) is not linked and
+keeps its own analysis in full, since the other one may be a different photo's
+guess.
+
+History stored before products existed can be linked with the command below.
+Only scans whose analysis is identical to their product's canonical one are
+linked, so no scan's stored result changes:
+
+    python -m app.services.products
+"""
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from cachetools import LRUCache
+from pymongo import ReturnDocument, UpdateOne
+from app.database.mongodb import get_collection, run_script
+
+# Analyses kept in memory; a product's analysis never changes once stored, so there is no TTL
+PRODUCT_INDEX_MAX_ENTRIES = int(os.getenv("PRODUCT_INDEX_MAX_ENTRIES", "5000"))
+
+# Response fields embedded in history documents alongside product_id
+SUMMARY_FIELDS = ("product_name", "serving_size", "rating", "category", "concerns", "processing_level", "allergens")
+
+# Fields besides allergens that analyses must agree on to share a product
+VERDICT_FIELDS = ("rating", "category", "concerns", "processing_level")
+
+# Names the model uses when it cannot identify the product
+UNIDENTIFIED_NAMES = {"", "unknown", "unknown product"}
+
+# Analysis version of history linked by link_existing_history, whose model and prompt are not recorded
+LEGACY_ANALYSIS_VERSION = "legacy"
+
+def _normalize(text: Optional[str]) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).strip()
+
+def product_key(product_name: Optional[str], serving_size: Optional[str], analysis_version: str) -> Optional[str]:
+    """Normalized product identity, or None when the product was not identified"""
+    name = _normalize(product_name)
+    if name in UNIDENTIFIED_NAMES:
+        return None
+    # "30 g", "30g" and "30 G" are the same serving
+    return f"{name}|{_normalize(serving_size).replace(' ', '')}|{analysis_version}"
+
+def summarize_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: analysis[field] for field in SUMMARY_FIELDS if field in analysis}
+
+def _verdict(analysis: Dict[str, Any]) -> Tuple[Any, ...]:
+    allergens = frozenset(_normalize(allergen) for allergen in analysis.get("allergens") or [])
+    return (allergens, *(analysis.get(field) for field in VERDICT_FIELDS))
+
+def analyses_agree(analysis: Dict[str, Any], other: Dict[str, Any]) -> bool:
+    """Whether two analyses of a product tell users the same about it (allergens compare as a set)"""
+    return _verdict(analysis) == _verdict(other)
+
+class ProductIndex:
+    """Canonical product analyses, read through an LRU of hot products"""
+
+    def __init__(self, max_entries: int):
+        self._hot = LRUCache(maxsize=max_entries)
+        # (barcode, analysis version) -> product id, for the barcode fast path in front of Gemini
+        self._barcodes = LRUCache(maxsize=max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.barcode_hits = 0
+        self.barcode_misses = 0
+        self.conflicts = 0
+
+    async def resolve(
+        self,
+        analysis: Dict[str, Any],
+        analysis_version: str,
+        barcode: Optional[str] = None
+    ) -> Tuple[Optional[str], Dict[str, Any]]:
+        """The product id and canonical analysis for a fresh analysis made by analysis_version.
+
+        A barcode read from the same photo is recorded on the product.
+        Unidentified products, and analyses that disagree with the canonical
+        one (see analyses_agree), get (None, analysis) and are stored in full.
+        """
+        key = product_key(analysis.get("product_name"), analysis.get("serving_size"), analysis_version)
+        if key is None:
+            return None, analysis
+        canonical = self._hot.get(key)
+        if canonical is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            # The first analysis stored wins; concurrent scans of a new product agree on it
+            doc = await get_collection("products").find_one_and_update(
+                {"_id": key},
+                {"$setOnInsert": {"analysis": analysis, "analysis_version": analysis_version, "created_at": datetime.utcnow()}},
+                upsert=True,
+                projection={"analysis": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            canonical = self._hot[key] = doc["analysis"]
+
+        if not analyses_agree(analysis, canonical):
+            # Same name and serving size, but e.g. different allergens: never swap this user's result
+            self.conflicts += 1
+            return None, analysis
+        if barcode and self._barcodes.get((barcode, analysis_version)) != key:
+            await get_collection("products").update_one({"_id": key}, {"$addToSet": {"barcodes": barcode}})
+            self._barcodes[(barcode, analysis_version)] = key
+        return key, canonical
+
+    async def find_by_barcode(self, barcode: str, analysis_version: str) -> Optional[Dict[str, Any]]:
+        """Canonical analysis of a product seen before with this barcode, if any, made by analysis_version"""
+        product_id = self._barcodes.get((barcode, analysis_version))
+        if product_id is not None:
+            analysis = self._hot.get(product_id)
+            if analysis is not None:
+                self.barcode_hits += 1
+                return analysis
+        doc = await get_collection("products").find_one(
+            {"barcodes": barcode, "analysis_version": analysis_version},
+            {"analysis": 1}
+        )
+        if doc is None:
+            self.barcode_misses += 1
+            return None
+        self.barcode_hits += 1
+        self._barcodes[(barcode, analysis_version)] = doc["_id"]
+        self._hot[doc["_id"]] = doc["analysis"]
+        return doc["analysis"]
+
+    async def get_many(self, product_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        missing = []
+        for product_id in set(product_ids):
+            analysis = self._hot.get(product_id)
+            if analysis is None:
+                missing.append(product_id)
+            else:
+                found[product_id] = analysis
+        self.hits += len(found)
+        if missing:
+            self.misses += len(missing)
+            async for doc in get_collection("products").find({"_id": {"$in": missing}}, {"analysis": 1}):
+                self._hot[doc["_id"]] = doc["analysis"]
+                found[doc["_id"]] = doc["analysis"]
+        return found
+
+    async def hydrate(self, scans: List[Dict[str, Any]], fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Replace the embedded summary of linked history documents with the full analysis.
+
+        With fields, only those response fields are filled in, matching a projection.
+        """
+        linked = [scan for scan in scans if scan.get("product_id")]
+        if not linked:
+            return scans
+        products = await self.get_many(scan["product_id"] for scan in linked)
+        wanted = set(fields) if fields is not None else None
+        for scan in linked:
+            analysis = products.get(scan["product_id"])
+            if analysis is None:
+                continue
+            if wanted is None:
+                scan["response"] = dict(analysis)
+            else:
+                scan["response"] = {field: value for field, value in analysis.items() if field in wanted}
+        return scans
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "barcode_hits": self.barcode_hits,
+            "barcode_misses": self.barcode_misses,
+            "conflicts": self.conflicts,
+            "hot_entries": len(self._hot),
+            "known_barcodes": len(self._barcodes),
+            "hot_max_entries": self._hot.maxsize,
+        }
+
+product_index = ProductIndex(PRODUCT_INDEX_MAX_ENTRIES)
+
+async def link_existing_history(db) -> int:
+    """Move full analyses embedded in older history documents into products.
+
+    Scans whose analysis differs from their product's canonical one keep it
+    embedded, since linking them would replace their result with another
+    scan's.
+    """
+    history = db["history"]
+    cursor = history.find(
+        {"product_id": {"$exists": False}, "response": {"$exists": True}},
+        {"response": 1}
+    )
+    linked = 0
+    batch = []
+    async for scan in cursor:
+        product_id, canonical = await product_index.resolve(scan["response"], LEGACY_ANALYSIS_VERSION)
+        if product_id is None or canonical != scan["response"]:
+            continue
+        batch.append(UpdateOne(
+            {"_id": scan["_id"]},
+            {"$set": {"product_id": product_id, "response": summarize_analysis(canonical)}}
+        ))
+        if len(batch) >= 1000:
+            await history.bulk_write(batch, ordered=False)
+            linked += len(batch)
+            batch = []
+    if batch:
+        await history.bulk_write(batch, ordered=False)
+        linked += len(batch)
+    return linked
+
+if __name__ == "__main__":
+    print(f"Linked {run_script(link_existing_history)} history documents to products")
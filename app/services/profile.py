@@ -1,7 +1,29 @@
+import os
 from datetime import date, datetime
-from app.database.mongodb import MongoDB
+from app.database.mongodb import get_collection
 from typing import Optional, Dict, Any
 from bson import ObjectId
+from cachetools import TTLCache
+from pymongo import ReturnDocument
+from app.services.profile_cache import profile_cache
+
+# Emails of users already confirmed to exist, keyed by user_id
+KNOWN_USER_CACHE_TTL_SECONDS = int(os.getenv("KNOWN_USER_CACHE_TTL_SECONDS", "3600"))
+KNOWN_USER_CACHE_MAX_ENTRIES = int(os.getenv("KNOWN_USER_CACHE_MAX_ENTRIES", "10000"))
+known_users = TTLCache(maxsize=KNOWN_USER_CACHE_MAX_ENTRIES, ttl=KNOWN_USER_CACHE_TTL_SECONDS)
+
+async def get_user_email(user_id: str) -> str:
+    """Email of an existing user, raising if there is no such user"""
+    email = known_users.get(user_id)
+    if email is not None:
+        return email
+    if not ObjectId.is_valid(user_id):
+        raise Exception("User not found")
+    user = await get_collection("users").find_one({"_id": ObjectId(user_id)}, {"email": 1})
+    if not user:
+        raise Exception("User not found")
+    known_users[user_id] = user["email"]
+    return user["email"]
 
 async def create_user_profile(
     user_id: str,
@@ -9,78 +31,71 @@ async def create_user_profile(
     date_of_birth: date,
     height: float,
     weight: float,
-    goal: str
+    goal: str,
+    user_email: Optional[str] = None
 ) -> str:
-    """Create a new user profile or update existing one"""
-    db = MongoDB()
-    try:
-        profiles = db.get_collection("user_profiles")
-        users = db.get_collection("users")
-        
-        # Verify user exists
-        user = users.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            raise Exception("User not found")
-        
-        user_email = user["email"]
-        
-        # Check if profile already exists
-        existing_profile = profiles.find_one({"user_id": user_id})
-        
-        profile_data = {
-            "user_id": user_id,
-            "user_email": user_email,
-            "gender": gender.lower(),
-            "date_of_birth": date_of_birth.isoformat(),
-            "height": height,
-            "weight": weight,
-            "goal": goal.lower(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        if existing_profile:
-            # Update existing profile
-            profiles.update_one(
-                {"user_id": user_id},
-                {"$set": profile_data}
-            )
-            profile_id = str(existing_profile["_id"])
-        else:
-            # Create new profile
-            profile_data["created_at"] = datetime.utcnow().isoformat()
-            result = profiles.insert_one(profile_data)
-            profile_id = str(result.inserted_id)
-        
-        return profile_id
-    finally:
-        db.close()
+    """Create a new user profile or update existing one.
+
+    Pass user_email when the caller is the authenticated user; otherwise the
+    user's existence is checked (and cached) first.
+    """
+    profiles = get_collection("user_profiles")
+    
+    if user_email is None:
+        user_email = await get_user_email(user_id)
+    
+    now = datetime.utcnow().isoformat()
+    profile_data = {
+        "user_id": user_id,
+        "user_email": user_email,
+        "gender": gender.lower(),
+        "date_of_birth": date_of_birth.isoformat(),
+        "height": height,
+        "weight": weight,
+        "goal": goal.lower(),
+        "updated_at": now
+    }
+    
+    # One atomic upsert; the unique index on user_id keeps concurrent submits to one profile
+    profile = await profiles.find_one_and_update(
+        {"user_id": user_id},
+        {"$set": profile_data, "$setOnInsert": {"created_at": now}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    
+    await profile_cache.set(user_id, format_profile(profile))
+    return str(profile["_id"])
+
+def format_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "user_id": profile["user_id"],
+        "gender": profile["gender"],
+        "date_of_birth": profile["date_of_birth"],
+        "height": profile["height"],
+        "weight": profile["weight"],
+        "goal": profile["goal"],
+        "created_at": profile.get("created_at"),
+        "updated_at": profile.get("updated_at")
+    }
+
+async def load_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    """Formatted profile, read through the profile cache"""
+    cached = await profile_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
+    profile = await get_collection("user_profiles").find_one({"user_id": user_id})
+    if not profile:
+        return None
+    
+    profile_response = format_profile(profile)
+    await profile_cache.set(user_id, profile_response)
+    return profile_response
 
 async def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
     """Get user profile by user_id"""
-    db = MongoDB()
-    try:
-        profiles = db.get_collection("user_profiles")
-        
-        # Get profile directly by user_id
-        profile = profiles.find_one({"user_id": user_id})
-        if not profile:
-            return None
-        
-        # Convert ObjectId to string and format response
-        profile_response = {
-            "user_id": profile["user_id"],
-            "gender": profile["gender"],
-            "date_of_birth": profile["date_of_birth"],
-            "height": profile["height"],
-            "weight": profile["weight"],
-            "goal": profile["goal"],
-            "created_at": profile.get("created_at"),
-            "updated_at": profile.get("updated_at")
-        }
-        
-        return profile_response
-    finally:
-        db.close()
+    return await load_user_profile(user_id)
 
 async def update_user_profile(
     user_id: str,
@@ -91,50 +106,30 @@ async def update_user_profile(
     goal: str
 ) -> bool:
     """Update user profile"""
-    db = MongoDB()
-    try:
-        profiles = db.get_collection("user_profiles")
-        
-        # Update profile directly by user_id
-        update_data = {
-            "gender": gender.lower(),
-            "date_of_birth": date_of_birth.isoformat(),
-            "height": height,
-            "weight": weight,
-            "goal": goal.lower(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        result = profiles.update_one(
-            {"user_id": user_id},
-            {"$set": update_data}
-        )
-        
-        return result.modified_count > 0
-    finally:
-        db.close()
+    profiles = get_collection("user_profiles")
+    
+    # Update profile directly by user_id
+    update_data = {
+        "gender": gender.lower(),
+        "date_of_birth": date_of_birth.isoformat(),
+        "height": height,
+        "weight": weight,
+        "goal": goal.lower(),
+        "updated_at": datetime.utcnow().isoformat()
+    }
+    
+    profile = await profiles.find_one_and_update(
+        {"user_id": user_id},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    if not profile:
+        await profile_cache.invalidate(user_id)
+        return False
+    
+    await profile_cache.set(user_id, format_profile(profile))
+    return True
 
 async def get_user_profile_by_id(user_id: str) -> Optional[Dict[str, Any]]:
     """Get user profile by user_id (helper function for internal use)"""
-    db = MongoDB()
-    try:
-        profiles = db.get_collection("user_profiles")
-        
-        profile = profiles.find_one({"user_id": user_id})
-        if not profile:
-            return None
-        
-        profile_response = {
-            "user_id": profile["user_id"],
-            "gender": profile["gender"],
-            "date_of_birth": profile["date_of_birth"],
-            "height": profile["height"],
-            "weight": profile["weight"],
-            "goal": profile["goal"],
-            "created_at": profile.get("created_at"),
-            "updated_at": profile.get("updated_at")
-        }
-        
-        return profile_response
-    finally:
-        db.close()
+    return await load_user_profile(user_id)
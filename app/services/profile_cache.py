@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Any
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# In-process tier (per worker); keep the TTL short since other workers' writes only reach it on expiry
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "10000"))
+PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60"))
+# Optional shared tier, e.g. redis://localhost:6379/0 (requires the redis package)
+PROFILE_CACHE_REDIS_URL = os.getenv("PROFILE_CACHE_REDIS_URL", "")
+PROFILE_CACHE_SHARED_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_SHARED_TTL_SECONDS", "900"))
+
+class ProfileCacheBackend(ABC):
+    """Shared store behind the in-process tier"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The stored profile, or None"""
+
+    @abstractmethod
+    async def set(self, key: str, profile: Dict[str, Any], ttl_seconds: int):
+        """Store a profile for ttl_seconds"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Drop a profile if present"""
+
+class LocalProfileCacheBackend(ProfileCacheBackend):
+    """In-memory stand-in for a shared store, for tests and single-worker setups"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 900):
+        self._store = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._store.get(key)
+
+    async def set(self, key: str, profile: Dict[str, Any], ttl_seconds: int):
+        self._store[key] = profile
+
+    async def delete(self, key: str):
+        self._store.pop(key, None)
+
+class RedisProfileCacheBackend(ProfileCacheBackend):
+    """Profiles shared by every worker through Redis"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = await self._client.get(key)
+        return json.loads(value) if value else None
+
+    async def set(self, key: str, profile: Dict[str, Any], ttl_seconds: int):
+        await self._client.set(key, json.dumps(profile), ex=ttl_seconds)
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+class ProfileCache:
+    """Read-through cache of formatted user profiles, keyed by user_id"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, backend: Optional[ProfileCacheBackend] = None,
+                 shared_ttl_seconds: int = PROFILE_CACHE_SHARED_TTL_SECONDS):
+        self._memory = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self.backend = backend
+        self.shared_ttl_seconds = shared_ttl_seconds
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"profile:{user_id}"
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        profile = self._memory.get(user_id)
+        if profile is not None:
+            self.memory_hits += 1
+            return profile
+
+        if self.backend is not None:
+            try:
+                profile = await self.backend.get(self._key(user_id))
+            except Exception:
+                # A shared tier outage only costs a database read
+                logger.exception("Profile cache backend read failed")
+                profile = None
+            if profile is not None:
+                self.shared_hits += 1
+                self._memory[user_id] = profile
+                return profile
+
+        self.misses += 1
+        return None
+
+    async def set(self, user_id: str, profile: Dict[str, Any]):
+        self._memory[user_id] = profile
+        if self.backend is not None:
+            try:
+                await self.backend.set(self._key(user_id), profile, self.shared_ttl_seconds)
+            except Exception:
+                logger.exception("Profile cache backend write failed")
+
+    async def invalidate(self, user_id: str):
+        self._memory.pop(user_id, None)
+        if self.backend is not None:
+            try:
+                await self.backend.delete(self._key(user_id))
+            except Exception:
+                logger.exception("Profile cache backend delete failed")
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_max_entries": self._memory.maxsize,
+        }
+
+def create_profile_cache_backend() -> Optional[ProfileCacheBackend]:
+    if PROFILE_CACHE_REDIS_URL:
+        return RedisProfileCacheBackend(PROFILE_CACHE_REDIS_URL)
+    return None
+
+profile_cache = ProfileCache(PROFILE_CACHE_MAX_ENTRIES, PROFILE_CACHE_TTL_SECONDS, create_profile_cache_backend())
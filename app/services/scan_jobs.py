@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import ASCENDING
+from app.database.mongodb import get_collection
+
+logger = logging.getLogger(__name__)
+
+# "local" keeps queued images in process memory; "mongo" stores them on the
+# job document so any worker can pick them up and jobs survive restarts
+SCAN_JOB_BACKEND = os.getenv("SCAN_JOB_BACKEND", "local").lower()
+SCAN_JOB_WORKERS = int(os.getenv("SCAN_JOB_WORKERS", "4"))
+SCAN_JOB_MAX_QUEUE = int(os.getenv("SCAN_JOB_MAX_QUEUE", "100"))
+SCAN_JOB_POLL_SECONDS = float(os.getenv("SCAN_JOB_POLL_SECONDS", "1"))
+# A "processing" job older than this is assumed to belong to a dead worker
+SCAN_JOB_LEASE_SECONDS = int(os.getenv("SCAN_JOB_LEASE_SECONDS", "300"))
+
+# Scan jobs live in the history collection; documents in these states have no result
+INCOMPLETE_STATUSES = ["pending", "processing", "failed"]
+COMPLETED_SCAN_FILTER = {"status": {"$nin": INCOMPLETE_STATUSES}}
+
+JobHandler = Callable[[ObjectId, bytes], Awaitable[None]]
+
+class ScanJobQueue(ABC):
+    """Background worker pool for scan jobs"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._handler: Optional[JobHandler] = None
+        self._tasks = []
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    async def start(self, handler: JobHandler):
+        self._handler = handler
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def check_capacity(self):
+        """Raise 429 before a job is created if it could not be queued"""
+
+    def stores_image(self) -> bool:
+        """Whether the image must be stored on the job document"""
+        return False
+
+    @abstractmethod
+    async def submit(self, scan_id: ObjectId, image_bytes: bytes):
+        """Hand a job whose document is already stored to the workers"""
+
+    @abstractmethod
+    async def _worker(self):
+        """Run jobs until cancelled"""
+
+    async def _run(self, scan_id: ObjectId, image_bytes: bytes):
+        try:
+            await self._handler(scan_id, image_bytes)
+        except Exception:
+            logger.exception("Scan job %s failed", scan_id)
+        finally:
+            self.notify(str(scan_id))
+
+    def notify(self, scan_id: str):
+        event = self._finished.pop(scan_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, scan_id: str, timeout: float):
+        """Wait until a job run by this worker finishes, or the timeout passes"""
+        event = self._finished.setdefault(scan_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            # The job may be running on another worker; callers re-read the document
+            self._finished.pop(scan_id, None)
+
+class LocalScanJobQueue(ScanJobQueue):
+    """In-process asyncio queue; queued jobs are lost if the worker restarts"""
+
+    def __init__(self, workers: int, max_queue: int):
+        super().__init__(workers)
+        self._queue = asyncio.Queue(maxsize=max_queue)
+
+    def _queue_full(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many scans queued, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+
+    def check_capacity(self):
+        if self._queue.full():
+            raise self._queue_full()
+
+    async def submit(self, scan_id: ObjectId, image_bytes: bytes):
+        try:
+            self._queue.put_nowait((scan_id, image_bytes))
+        except asyncio.QueueFull:
+            # Filled up after check_capacity, while the job document was inserted
+            raise self._queue_full()
+
+    async def _worker(self):
+        while True:
+            scan_id, image_bytes = await self._queue.get()
+            try:
+                await self._run(scan_id, image_bytes)
+            finally:
+                self._queue.task_done()
+
+class MongoScanJobQueue(ScanJobQueue):
+    """Workers claim pending job documents from the history collection"""
+
+    def __init__(self, workers: int, poll_seconds: float, lease_seconds: int):
+        super().__init__(workers)
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+
+    def stores_image(self) -> bool:
+        return True
+
+    async def submit(self, scan_id: ObjectId, image_bytes: bytes):
+        # The image is already on the job document; just wake an idle worker
+        self._wakeup.set()
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        return await get_collection("history").find_one_and_update(
+            {
+                "image": {"$exists": True},
+                "$or": [
+                    {"status": "pending"},
+                    {"status": "processing", "started_at": {"$lt": now - timedelta(seconds=self.lease_seconds)}},
+                ],
+            },
+            {"$set": {"status": "processing", "started_at": now}},
+            sort=[("timestamp", ASCENDING)],
+            projection={"image": 1},
+        )
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Could not claim a scan job")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job["_id"], bytes(job["image"]))
+
+def create_scan_job_queue() -> ScanJobQueue:
+    if SCAN_JOB_BACKEND == "mongo":
+        return MongoScanJobQueue(SCAN_JOB_WORKERS, SCAN_JOB_POLL_SECONDS, SCAN_JOB_LEASE_SECONDS)
+    return LocalScanJobQueue(SCAN_JOB_WORKERS, SCAN_JOB_MAX_QUEUE)
+
+scan_jobs = create_scan_job_queue()
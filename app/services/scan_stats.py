@@ -0,0 +1,110 @@
+"""Per-user daily scan rollups backing the dashboard stats.
+
+Every stored scan increments one user_daily_stats document per user and IST
+day, so the dashboard reads at most a week of small documents instead of
+re-aggregating raw history. Rebuild the rollups from history with:
+
+    python -m app.services.scan_stats
+"""
+from datetime import datetime, date
+from typing import Any, Dict, Iterable, List
+from pymongo import ReplaceOne, UpdateOne
+from app.database.mongodb import get_collection, run_script
+from app.services.scan_jobs import COMPLETED_SCAN_FILTER
+from app.services.timezones import to_ist
+from app.services.history_versions import bump_history_versions
+
+def ist_day(timestamp: datetime) -> str:
+    """IST calendar day (YYYY-MM-DD) of a naive UTC timestamp"""
+    return to_ist(timestamp).date().isoformat()
+
+def _field_key(value: Any) -> str:
+    # Values become sub-document keys, which cannot contain dots or start with "$"
+    return str(value).replace(".", "_").lstrip("$") or "unknown"
+
+def stat_increments(response: Dict[str, Any]) -> Dict[str, int]:
+    """Counters a single scan adds to its day's rollup"""
+    rating = (response.get("rating") or "").lower()
+    concerns = response.get("concerns", 0) or 0
+    healthy = rating in ["good", "excellent"]
+    concerning = not healthy and (rating == "poor" or concerns >= 3)
+    return {
+        "scans": 1,
+        "healthy": int(healthy),
+        "concerning": int(concerning),
+        "concerns_total": concerns,
+        f"ratings.{_field_key(rating or 'unknown')}": 1,
+        f"categories.{_field_key(response.get('category') or 'unknown')}": 1,
+        f"processing_levels.{_field_key(response.get('processing_level') or 'unknown')}": 1,
+    }
+
+def _rollup_update(user_id: str, timestamp: datetime, response: Dict[str, Any]) -> UpdateOne:
+    return UpdateOne(
+        {"user_id": user_id, "day": ist_day(timestamp)},
+        {"$inc": stat_increments(response), "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+async def record_scan_stats(scans: Iterable[Dict[str, Any]]):
+    """Fold newly stored history documents into their daily rollups"""
+    updates = [
+        _rollup_update(scan["user_id"], scan["timestamp"], scan["response"])
+        for scan in scans
+        if scan.get("user_id") and scan.get("response")
+    ]
+    if updates:
+        await get_collection("user_daily_stats").bulk_write(updates, ordered=False)
+
+async def get_daily_stats(db, user_id: str, first_day: date, last_day: date) -> List[Dict[str, Any]]:
+    return await db["user_daily_stats"].find({
+        "user_id": user_id,
+        "day": {"$gte": first_day.isoformat(), "$lte": last_day.isoformat()}
+    }).to_list(length=None)
+
+async def backfill_daily_stats(db) -> int:
+    """Rebuild every rollup from history. Run it while scan traffic is low,
+    since scans stored during the rebuild can be counted twice."""
+    started = datetime.utcnow()
+    rollups: Dict[tuple, Dict[str, Any]] = {}
+    cursor = db["history"].find(
+        {"user_id": {"$ne": None}, **COMPLETED_SCAN_FILTER},
+        {
+            "user_id": 1,
+            "timestamp": 1,
+            "response.rating": 1,
+            "response.concerns": 1,
+            "response.category": 1,
+            "response.processing_level": 1
+        }
+    )
+    async for scan in cursor:
+        if not scan.get("timestamp") or not scan.get("response"):
+            continue
+        key = (scan["user_id"], ist_day(scan["timestamp"]))
+        rollup = rollups.setdefault(key, {})
+        for field, amount in stat_increments(scan["response"]).items():
+            parent, _, child = field.partition(".")
+            if child:
+                counts = rollup.setdefault(parent, {})
+                counts[child] = counts.get(child, 0) + amount
+            else:
+                rollup[field] = rollup.get(field, 0) + amount
+
+    stats = db["user_daily_stats"]
+    replacements = [
+        ReplaceOne(
+            {"user_id": user_id, "day": day},
+            {"user_id": user_id, "day": day, **rollup, "updated_at": started},
+            upsert=True
+        )
+        for (user_id, day), rollup in rollups.items()
+    ]
+    for offset in range(0, len(replacements), 1000):
+        await stats.bulk_write(replacements[offset:offset + 1000], ordered=False)
+    # Days that no longer have any history and were not touched since the rebuild started
+    await stats.delete_many({"updated_at": {"$lt": started}})
+    await bump_history_versions(user_id for user_id, _ in rollups)
+    return len(replacements)
+
+if __name__ == "__main__":
+    print(f"Rebuilt {run_script(backfill_daily_stats)} daily rollups")
@@ -0,0 +1,10 @@
+from datetime import datetime, timezone, timedelta
+
+# IST timezone (UTC+5:30), used for every reported timestamp and calendar day
+IST = timezone(timedelta(hours=5, minutes=30))
+
+def to_ist(value: datetime) -> datetime:
+    """A stored timestamp as an aware IST datetime; naive ones are UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(IST)
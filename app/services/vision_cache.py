@@ -0,0 +1,64 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Optional, Dict, Any
+from cachetools import TTLCache
+from app.database.mongodb import get_collection
+
+# In-memory tier (per worker)
+VISION_CACHE_MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "1024"))
+VISION_CACHE_TTL_SECONDS = int(os.getenv("VISION_CACHE_TTL_SECONDS", "3600"))
+# Persistent tier (shared by all workers), expired by a TTL index on created_at
+VISION_CACHE_MONGO_TTL_SECONDS = int(os.getenv("VISION_CACHE_MONGO_TTL_SECONDS", str(30 * 24 * 3600)))
+
+class VisionCache:
+    """Two-tier cache of Gemini vision results keyed by image content"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self._memory = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_bytes: bytes, model_name: str, prompt_version: str) -> str:
+        """Cache key from the image bytes plus the model and prompt that produced the result"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{model_name}:{prompt_version}:{digest}"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        response = self._memory.get(key)
+        if response is not None:
+            self.memory_hits += 1
+            return response
+
+        doc = await get_collection("vision_cache").find_one({"_id": key}, {"response": 1})
+        if doc:
+            self.mongo_hits += 1
+            self._memory[key] = doc["response"]
+            return doc["response"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: Dict[str, Any]):
+        self._memory[key] = response
+        await get_collection("vision_cache").update_one(
+            {"_id": key},
+            {"$set": {"response": response, "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.mongo_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_max_entries": self._memory.maxsize,
+        }
+
+vision_cache = VisionCache(VISION_CACHE_MAX_ENTRIES, VISION_CACHE_TTL_SECONDS)
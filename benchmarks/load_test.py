@@ -0,0 +1,330 @@
+"""Load test: the full app against a local mongod with a stub Gemini client.
+
+Boots app.main:app in-process (lifespan included) against a throwaway
+database, replaces the Gemini client with a stub that sleeps for a
+configurable latency, then drives a weighted mix of login, vision, history,
+dashboard overview and alerts requests at rising concurrency. For each
+level it reports req/s, p50/p95/p99 latency and Mongo commands (round trips)
+per request, by operation.
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.load_test \\
+        --concurrency 1 8 32 --requests 400 --save benchmarks/baseline.json
+
+    # later, on another commit
+    python -m benchmarks.load_test --compare benchmarks/baseline.json
+
+The benchmark database (--db, default health_bench) is dropped before each run.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+import types as pytypes
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Round trips made while handling the current benchmark request
+_round_trips: ContextVar[Optional[list]] = ContextVar("round_trips", default=None)
+
+# Relative weights of each operation in the request mix
+DEFAULT_MIX = {"login": 5, "vision": 10, "history": 30, "overview": 35, "alerts": 20}
+
+RATINGS = ["poor", "average", "good", "excellent"]
+CATEGORIES = ["beverage", "cereal", "snack", "meal"]
+PROCESSING_LEVELS = ["semi_processed", "processed", "highly_processed"]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def install_command_counter():
+    """Count every command sent to Mongo, attributed to the request that sent it"""
+    from pymongo import monitoring
+
+    class CommandCounter(monitoring.CommandListener):
+        def started(self, event):
+            counter = _round_trips.get()
+            if counter is not None:
+                counter[0] += 1
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    # Registered globally, so it applies to the client the app creates on startup
+    monitoring.register(CommandCounter())
+
+
+def stub_gemini(genai_routes, latency_ms: float, jitter_ms: float):
+    """Replace the Gemini client with one that answers after a simulated delay"""
+
+    class StubModels:
+        async def generate_content(self, model, contents, config=None):
+            await asyncio.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+            concerns = random.randint(0, 6)
+            response = {
+                "product_name": f"Product {random.randint(1, 500)}",
+                "serving_size": "30g",
+                "calories": str(random.randint(50, 400)),
+                "total_ingredients": 3,
+                "ingredient_categories": [
+                    {"category_name": "Others", "count": 3, "ingredients": ["sugar", "salt", "flour"], "color_code": "gray"}
+                ],
+                "nutrition_facts": [
+                    {"name": "Sodium", "amount": "120mg", "percentage_dv": "5%", "category": "others"}
+                ],
+                "concerns": concerns,
+                "concerns_message": f"{concerns} concerns",
+                "additives": [],
+                "allergens": random.choice([[], ["milk"], ["nuts", "soy"]]),
+                "allergens_message": "",
+                "alternate_home_made_recipe": "Mix oats with fruit.",
+                "rating": random.choice(RATINGS),
+                "category": random.choice(CATEGORIES),
+                "processing_level": random.choice(PROCESSING_LEVELS),
+            }
+            return pytypes.SimpleNamespace(text=json.dumps(response))
+
+    genai_routes.client = pytypes.SimpleNamespace(aio=pytypes.SimpleNamespace(models=StubModels()))
+
+
+def make_image(size=(640, 480)) -> bytes:
+    """A random JPEG, so fresh uploads miss the vision caches"""
+    from PIL import Image
+
+    base = Image.frombytes("L", (size[0] // 16, size[1] // 16), os.urandom(size[0] * size[1] // 256))
+    buffer = io.BytesIO()
+    base.resize(size).convert("RGB").save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class LoadTest:
+    def __init__(self, client, users: List[Dict[str, str]], mix: Dict[str, int], repeat_images: List[bytes], repeat_ratio: float):
+        self.client = client
+        self.users = users
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.repeat_images = repeat_images
+        self.repeat_ratio = repeat_ratio
+
+    async def login(self, user):
+        return await self.client.post("/api/v1/auth/login", json={"email": user["email"], "password": user["password"]})
+
+    async def vision(self, user):
+        # Some uploads repeat earlier photos, as users rescan the same products
+        if self.repeat_images and random.random() < self.repeat_ratio:
+            image = random.choice(self.repeat_images)
+        else:
+            image = make_image()
+        return await self.client.post(
+            "/api/v1/genai/vision",
+            params={"user_id": user["user_id"]},
+            files={"file": ("scan.jpg", image, "image/jpeg")},
+        )
+
+    async def history(self, user):
+        return await self.client.get("/api/v1/genai/history", params={"user_id": user["user_id"]})
+
+    async def overview(self, user):
+        return await self.client.get(f"/api/v1/dashboard/overview/{user['user_id']}")
+
+    async def alerts(self, user):
+        return await self.client.get(f"/api/v1/dashboard/alerts/{user['user_id']}")
+
+    async def run_one(self, results: Dict[str, dict]):
+        name = random.choices(self.operations, self.weights)[0]
+        user = random.choice(self.users)
+        counter = [0]
+        token = _round_trips.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await getattr(self, name)(user)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        finally:
+            _round_trips.reset(token)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        result = results.setdefault(name, {"latencies": [], "errors": 0, "round_trips": 0})
+        result["latencies"].append(elapsed_ms)
+        result["round_trips"] += counter[0]
+        if not ok:
+            result["errors"] += 1
+
+    async def run_level(self, concurrency: int, total_requests: int) -> dict:
+        results: Dict[str, dict] = {}
+        remaining = total_requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                await self.run_one(results)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return summarize(results, elapsed)
+
+
+def summarize(results: Dict[str, dict], elapsed: float) -> dict:
+    def stats(latencies, errors, round_trips):
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "req_per_s": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "round_trips_per_request": round(round_trips / len(latencies), 2),
+        }
+
+    summary = {
+        name: stats(r["latencies"], r["errors"], r["round_trips"])
+        for name, r in sorted(results.items())
+    }
+    summary["all"] = stats(
+        [ms for r in results.values() for ms in r["latencies"]],
+        sum(r["errors"] for r in results.values()),
+        sum(r["round_trips"] for r in results.values()),
+    )
+    return summary
+
+
+def print_level(concurrency: int, summary: dict):
+    print(f"\nconcurrency={concurrency}")
+    print(f"  {'operation':<10} {'reqs':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mongo/req':>10}")
+    for name, s in summary.items():
+        print(
+            f"  {name:<10} {s['requests']:>6} {s['errors']:>6} {s['req_per_s']:>9.1f} "
+            f"{s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['round_trips_per_request']:>10.2f}"
+        )
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> bool:
+    """Print p95 and throughput changes against a baseline; True if any regressed"""
+    regressed = False
+    print(f"\nCompared with baseline from {baseline.get('commit', 'unknown')}:")
+    for level, summary in current["levels"].items():
+        base_summary = baseline["levels"].get(level)
+        if not base_summary:
+            continue
+        for name, s in summary.items():
+            base = base_summary.get(name)
+            if not base:
+                continue
+            p95_change = (s["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+            rps_change = (s["req_per_s"] - base["req_per_s"]) / base["req_per_s"] if base["req_per_s"] else 0.0
+            flag = p95_change > tolerance or rps_change < -tolerance
+            regressed = regressed or flag
+            print(
+                f"  c={level:<4} {name:<10} p95 {base['p95_ms']:.1f} -> {s['p95_ms']:.1f} ms ({p95_change:+.0%}), "
+                f"req/s {base['req_per_s']:.1f} -> {s['req_per_s']:.1f} ({rps_change:+.0%})"
+                + ("  REGRESSION" if flag else "")
+            )
+    return regressed
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> dict:
+    import httpx
+    import app.routes.genai as genai_routes
+    from app.main import app
+    from app.database.mongodb import mongodb
+
+    stub_gemini(genai_routes, args.gemini_latency_ms, args.gemini_jitter_ms)
+
+    # Start from an empty benchmark database; startup then recreates the indexes
+    mongodb.connect()
+    await mongodb.client.drop_database(args.db)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            users = []
+            for i in range(args.users):
+                user = {"email": f"bench{i}@example.com", "password": "bench-password"}
+                response = await client.post("/api/v1/auth/register", json={**user, "name": f"Bench {i}"})
+                response.raise_for_status()
+                users.append({**user, "user_id": response.json()["user_id"]})
+
+            repeat_images = [make_image() for _ in range(args.repeat_pool)]
+            load = LoadTest(client, users, DEFAULT_MIX, repeat_images, args.repeat_ratio)
+
+            # Give every user some history so reads have data to return
+            seed = LoadTest(client, users, {"vision": 1}, repeat_images, args.repeat_ratio)
+            await seed.run_level(min(8, args.users), args.users * args.seed_scans)
+
+            levels = {}
+            for concurrency in args.concurrency:
+                summary = await load.run_level(concurrency, args.requests)
+                print_level(concurrency, summary)
+                levels[str(concurrency)] = summary
+
+    return {
+        "commit": current_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "settings": {
+            "users": args.users,
+            "requests_per_level": args.requests,
+            "gemini_latency_ms": args.gemini_latency_ms,
+            "mix": DEFAULT_MIX,
+        },
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=500, help="requests per concurrency level")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed-scans", type=int, default=5, help="scans stored per user before measuring")
+    parser.add_argument("--gemini-latency-ms", type=float, default=800)
+    parser.add_argument("--gemini-jitter-ms", type=float, default=200)
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="share of uploads reusing an earlier photo")
+    parser.add_argument("--repeat-pool", type=int, default=20)
+    parser.add_argument("--db", default="health_bench", help="database to use; it is dropped first")
+    parser.add_argument("--save", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p95/throughput change before flagging")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so configure the app before importing it
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    install_command_counter()
+
+    result = asyncio.run(run(args))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, result, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Login storm: bcrypt throughput and the latency it costs other endpoints.
+
+Runs a burst of password verifications alongside a steady stream of requests
+to the root endpoint, once with bcrypt called inline on the event loop (how
+login used to work) and once through the bounded worker pool. No database is
+needed; the probe requests go straight to the ASGI app.
+
+    python -m benchmarks.login_storm --logins 64 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def probe(client, stop: asyncio.Event, latencies: list):
+    """Request the root endpoint back to back until the storm ends"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def run_storm(mode: str, logins: int, password: str, hashed: str):
+    import httpx
+    from app.main import app
+    from app.services import auth
+
+    async def inline_login():
+        return auth.verify_password(password, hashed)
+
+    login = inline_login if mode == "inline" else lambda: auth.verify_password_async(password, hashed)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/")  # warm up routing
+        stop = asyncio.Event()
+        latencies = []
+        probe_task = asyncio.create_task(probe(client, stop, latencies))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(login() for _ in range(logins)), return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    ok = sum(1 for r in results if r is True)
+    return {
+        "mode": mode,
+        "logins_ok": ok,
+        "logins_per_s": ok / elapsed,
+        "probe_requests": len(latencies),
+        "probe_p50_ms": statistics.median(latencies) if latencies else None,
+        "probe_p99_ms": percentile(latencies, 99) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64, help="concurrent password verifications")
+    parser.add_argument("--rounds", type=int, default=None, help="bcrypt cost factor (defaults to BCRYPT_ROUNDS)")
+    parser.add_argument("--workers", type=int, default=None, help="bcrypt worker threads (defaults to PASSWORD_HASH_WORKERS)")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so apply overrides first
+    if args.rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    if args.workers is not None:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    # Let every storm request queue rather than be rejected
+    os.environ.setdefault("PASSWORD_HASH_MAX_QUEUE", str(args.logins))
+    os.environ.setdefault("PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS", "600")
+
+    from app.services import auth
+    password = "correct horse battery staple"
+    hashed = auth.get_password_hash(password)
+    print(f"bcrypt rounds={auth.BCRYPT_ROUNDS} workers={auth.PASSWORD_HASH_WORKERS} logins={args.logins}")
+
+    for mode in ("inline", "pool"):
+        result = asyncio.run(run_storm(mode, args.logins, password, hashed))
+        p50 = result["probe_p50_ms"]
+        p99 = result["probe_p99_ms"]
+        print(
+            f"{mode:>6}: {result['logins_per_s']:.1f} logins/s, "
+            f"{result['probe_requests']} probe requests, "
+            f"probe p50={p50 if p50 is None else round(p50, 1)}ms p99={p99 if p99 is None else round(p99, 1)}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""In-memory stand-ins for the async MongoDB collections and an in-process client for the app.
+
+Only the query operators and cursor methods the routes under test use are
+implemented.
+"""
+import copy
+import os
+from contextlib import asynccontextmanager
+
+import httpx
+from bson import ObjectId
+
+# Settings are read at import time
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from app.main import app  # noqa: E402
+from app.database.mongodb import get_database  # noqa: E402
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+def _matches_condition(value, condition):
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return value == condition
+    for operator, operand in condition.items():
+        if operator == "$lt" and not (value is not None and value < operand):
+            return False
+        if operator == "$gt" and not (value is not None and value > operand):
+            return False
+        if operator == "$ne" and value == operand:
+            return False
+        if operator == "$in" and value not in operand:
+            return False
+        if operator == "$nin" and value in operand:
+            return False
+        if operator == "$exists" and (value is not None) != operand:
+            return False
+    return True
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+        elif not _matches_condition(_get(doc, key), condition):
+            return False
+    return True
+
+def project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    if all(not value for value in projection.values()):
+        return {key: copy.deepcopy(value) for key, value in doc.items() if key not in projection}
+    result = {"_id": doc["_id"]}
+    for path in projection:
+        value = _get(doc, path)
+        if value is None:
+            continue
+        target = result
+        *parents, leaf = path.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = copy.deepcopy(value)
+    return result
+
+def apply_update(doc, update):
+    doc.update(update.get("$set", {}))
+    for key, value in update.get("$addToSet", {}).items():
+        values = doc.setdefault(key, [])
+        if value not in values:
+            values.append(value)
+
+class MemoryCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction)]
+        for key, direction in reversed(keys):
+            self._docs.sort(key=lambda doc: _get(doc, key), reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self._docs = self._docs[:count]
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length=None):
+        return self._docs
+
+    async def __aiter__(self):
+        for doc in self._docs:
+            yield doc
+
+class MemoryCollection:
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query=None, projection=None):
+        found = [doc for doc in self.docs if matches(doc, query or {})]
+        return MemoryCursor([project(doc, projection) for doc in found])
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        docs = await cursor.limit(1).to_list()
+        return docs[0] if docs else None
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(copy.deepcopy(doc))
+        return type("InsertOneResult", (), {"inserted_id": doc["_id"]})()
+
+    async def find_one_and_update(self, query, update, upsert=False, projection=None, return_document=None, **kwargs):
+        doc = next((doc for doc in self.docs if matches(doc, query)), None)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = {"_id": ObjectId(), **{key: value for key, value in query.items() if not key.startswith("$")}}
+            doc.update(update.get("$setOnInsert", {}))
+            self.docs.append(doc)
+        apply_update(doc, update)
+        return project(doc, projection)
+
+    async def update_one(self, query, update):
+        doc = next((doc for doc in self.docs if matches(doc, query)), None)
+        if doc is not None:
+            apply_update(doc, update)
+
+class MemoryDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, MemoryCollection())
+
+@asynccontextmanager
+async def app_client(db):
+    """httpx client for the app, with get_database returning db"""
+    async def override_database():
+        return db
+
+    app.dependency_overrides[get_database] = override_database
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_database, None)
@@ -0,0 +1,57 @@
+"""Concurrent requests must overlap their Mongo waits rather than queue behind each other.
+
+The app runs in-process over httpx.ASGITransport against a stand-in database
+whose every call sleeps, so no mongod or Gemini key is needed.
+"""
+import asyncio
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from tests.stubs import app_client
+
+# Simulated latency of each Mongo call, and how many requests run at once
+MONGO_DELAY_SECONDS = 0.2
+CONCURRENT_REQUESTS = 10
+
+class SlowCollection:
+    """Collection stand-in that takes MONGO_DELAY_SECONDS to answer every find_one"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def find_one(self, query, projection=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(MONGO_DELAY_SECONDS)
+        return {
+            "_id": query.get("_id", ObjectId()),
+            "user_id": query.get("user_id"),
+            "timestamp": datetime.utcnow(),
+            "response": {"product_name": "Oat Bar", "rating": "good"},
+        }
+
+class SlowDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, SlowCollection())
+
+async def _fetch_concurrently(db: SlowDatabase) -> float:
+    async with app_client(db) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.get(f"/api/v1/genai/history/{ObjectId()}", params={"user_id": "u1"})
+            for _ in range(CONCURRENT_REQUESTS)
+        ))
+        elapsed = time.perf_counter() - started
+    assert [r.status_code for r in responses] == [200] * CONCURRENT_REQUESTS
+    return elapsed
+
+def test_slow_mongo_calls_do_not_serialize_requests():
+    db = SlowDatabase()
+    elapsed = asyncio.run(_fetch_concurrently(db))
+    assert db["history"].calls == CONCURRENT_REQUESTS
+    # Serialized requests would take CONCURRENT_REQUESTS * MONGO_DELAY_SECONDS (2s)
+    assert elapsed < 3 * MONGO_DELAY_SECONDS
@@ -0,0 +1,76 @@
+"""decode_barcode against EAN-13/EAN-8 codes rendered with Pillow.
+
+Codes are drawn as bars on a cluttered background, blurred and saved as JPEG
+so the decoder sees something closer to a photo than a clean bitmap.
+"""
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.services.barcode import decode_barcode
+
+# Module bit patterns: L (odd parity), G (even parity) and R (right-hand) digit codes
+L_CODES = ["0001101", "0011001", "0010011", "0111101", "0100011", "0110001", "0101111", "0111011", "0110111", "0001011"]
+G_CODES = ["0100111", "0110011", "0011011", "0100001", "0011101", "0111001", "0000101", "0010001", "0001001", "0010111"]
+R_CODES = ["1110010", "1100110", "1101100", "1000010", "1011100", "1001110", "1010000", "1000100", "1001000", "1110100"]
+# L/G parity of the left half, selected by the leading EAN-13 digit
+PARITY = ["LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG", "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL"]
+
+EAN13 = "4006381333931"
+EAN8 = "96385074"
+UPC_A = "036000291452"
+
+def ean13_bits(code: str) -> str:
+    parity = PARITY[int(code[0])]
+    left = "".join((L_CODES if p == "L" else G_CODES)[int(d)] for p, d in zip(parity, code[1:7]))
+    right = "".join(R_CODES[int(d)] for d in code[7:])
+    return "101" + left + "01010" + right + "101"
+
+def ean8_bits(code: str) -> str:
+    left = "".join(L_CODES[int(d)] for d in code[:4])
+    right = "".join(R_CODES[int(d)] for d in code[4:])
+    return "101" + left + "01010" + right + "101"
+
+def render(bits: str = "", rotate: int = 0, module: int = 3) -> bytes:
+    """JPEG of a cluttered background with the bars drawn on a light label"""
+    rng = random.Random(25)
+    img = Image.new("L", (1000, 700), 200)
+    draw = ImageDraw.Draw(img)
+    for _ in range(300):
+        x, y = rng.randrange(1000), rng.randrange(700)
+        draw.rectangle([x, y, x + rng.randint(2, 30), y + rng.randint(2, 30)], fill=rng.randint(60, 230))
+    if bits:
+        x0, y0 = 250, 250
+        draw.rectangle([x0 - 12 * module, y0 - 10, x0 + (len(bits) + 12) * module, y0 + 210], fill=245)
+        for i, bit in enumerate(bits):
+            if bit == "1":
+                draw.rectangle([x0 + i * module, y0, x0 + (i + 1) * module - 1, y0 + 200], fill=20)
+    img = img.filter(ImageFilter.GaussianBlur(0.8))
+    if rotate:
+        img = img.rotate(rotate, expand=True, fillcolor=200)
+    buffer = io.BytesIO()
+    img.convert("RGB").save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("rotate", [0, 90, 180, 270])
+def test_reads_ean13_in_any_orientation(rotate):
+    assert decode_barcode(render(ean13_bits(EAN13), rotate=rotate)) == EAN13
+
+@pytest.mark.parametrize("rotate", [0, 90, 180])
+def test_reads_ean8(rotate):
+    assert decode_barcode(render(ean8_bits(EAN8), rotate=rotate)) == EAN8
+
+def test_upc_a_reads_as_ean13():
+    assert decode_barcode(render(ean13_bits("0" + UPC_A))) == "0" + UPC_A
+
+def test_photo_without_barcode():
+    assert decode_barcode(render()) is None
+
+def test_wrong_check_digit_is_rejected():
+    # Valid bars for every digit, but the check digit does not match
+    bad = EAN13[:-1] + str((int(EAN13[-1]) + 1) % 10)
+    assert decode_barcode(render(ean13_bits(bad))) is None
+    bad8 = EAN8[:-1] + str((int(EAN8[-1]) + 1) % 10)
+    assert decode_barcode(render(ean8_bits(bad8))) is None
@@ -0,0 +1,70 @@
+"""Keyset pagination and field selection of GET /api/v1/genai/history."""
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from tests.stubs import MemoryDatabase, app_client
+
+HISTORY_URL = "/api/v1/genai/history"
+
+def make_db(timestamps):
+    db = MemoryDatabase()
+    for timestamp in timestamps:
+        db["history"].docs.append({
+            "_id": ObjectId(),
+            "user_id": "u1",
+            "timestamp": timestamp,
+            "response": {"product_name": "Oat Bar", "rating": "good", "calories": "150"},
+            "phash": "00ff00ff00ff00ff",
+        })
+    return db
+
+async def fetch_all_pages(db, limit):
+    pages = []
+    async with app_client(db) as client:
+        params = {"user_id": "u1", "limit": limit}
+        while True:
+            response = await client.get(HISTORY_URL, params=params)
+            assert response.status_code == 200
+            body = response.json()
+            pages.append([doc["_id"] for doc in body["history"]])
+            if body["next_cursor"] is None:
+                return pages
+            params["cursor"] = body["next_cursor"]
+
+def test_pages_continue_past_timestamp_ties():
+    now = datetime.utcnow()
+    # Five scans share one timestamp, and a page boundary falls inside them
+    db = make_db([now] * 5 + [now - timedelta(minutes=1)] * 2)
+    pages = asyncio.run(fetch_all_pages(db, limit=2))
+    expected = [
+        str(doc["_id"])
+        for doc in sorted(db["history"].docs, key=lambda doc: (doc["timestamp"], doc["_id"]), reverse=True)
+    ]
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert [scan_id for page in pages for scan_id in page] == expected
+
+def test_invalid_cursor_returns_400():
+    async def run():
+        async with app_client(make_db([datetime.utcnow()])) as client:
+            return await client.get(HISTORY_URL, params={"user_id": "u1", "cursor": "not-a-cursor"})
+    response = asyncio.run(run())
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+def test_fields_select_response_fields():
+    async def run():
+        async with app_client(make_db([datetime.utcnow()])) as client:
+            return await client.get(HISTORY_URL, params={"user_id": "u1", "fields": "product_name,rating,timestamp"})
+    doc = asyncio.run(run()).json()["history"][0]
+    assert doc["response"] == {"product_name": "Oat Bar", "rating": "good"}
+    assert "timestamp" in doc and "phash" not in doc
+
+def test_unknown_field_returns_400():
+    async def run():
+        async with app_client(make_db([datetime.utcnow()])) as client:
+            return await client.get(HISTORY_URL, params={"user_id": "u1", "fields": "product_name,password"})
+    response = asyncio.run(run())
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown field: password"
@@ -0,0 +1,85 @@
+"""Shared product analyses: linking scans, refusing conflicting ones, and keeping product_id internal."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import app.services.products as products
+from app.services.products import ProductIndex, summarize_analysis
+from tests.stubs import MemoryDatabase, app_client
+
+VERSION = "test-model/1"
+
+ANALYSIS = {
+    "product_name": "Peanut Crunch Bar",
+    "serving_size": "40 g",
+    "calories": "190",
+    "concerns": 1,
+    "allergens": ["Peanuts", "Milk"],
+    "rating": "average",
+    "category": "snack",
+    "processing_level": "processed",
+}
+
+@pytest.fixture
+def db(monkeypatch):
+    db = MemoryDatabase()
+    monkeypatch.setattr(products, "get_collection", lambda name: db[name])
+    return db
+
+def test_matching_scans_share_one_product(db):
+    index = ProductIndex(max_entries=10)
+    # Same product, allergens listed in another order and case
+    rescan = {**ANALYSIS, "serving_size": "40g", "calories": "195", "allergens": ["milk", "peanuts"]}
+
+    async def run():
+        return await index.resolve(ANALYSIS, VERSION), await index.resolve(rescan, VERSION)
+
+    (first_id, first), (second_id, second) = asyncio.run(run())
+    assert first_id == second_id is not None
+    assert first == second == ANALYSIS
+    assert len(db["products"].docs) == 1
+    assert index.conflicts == 0
+
+def test_conflicting_analysis_is_kept(db):
+    index = ProductIndex(max_entries=10)
+    # Another photo of the same name and serving size, read with a different allergen
+    rescan = {**ANALYSIS, "allergens": ["Peanuts", "Milk", "Soy"]}
+
+    async def run():
+        await index.resolve(ANALYSIS, VERSION)
+        return await index.resolve(rescan, VERSION, barcode="4006381333931")
+
+    assert asyncio.run(run()) == (None, rescan)
+    assert index.conflicts == 1
+    # The conflicting photo's barcode is not attached to the stored product
+    assert "barcodes" not in db["products"].docs[0]
+
+def test_history_responses_hide_product_id(db):
+    user_id = f"u-{ObjectId()}"
+    scan_id = ObjectId()
+
+    async def run():
+        product_id, canonical = await products.product_index.resolve(ANALYSIS, VERSION)
+        db["history"].docs.append({
+            "_id": scan_id,
+            "user_id": user_id,
+            "response": summarize_analysis(canonical),
+            "product_id": product_id,
+            "timestamp": datetime.utcnow(),
+        })
+        async with app_client(db) as client:
+            params = {"user_id": user_id}
+            listed = await client.get("/api/v1/genai/history", params=params)
+            selected = await client.get("/api/v1/genai/history", params={**params, "fields": "calories"})
+            item = await client.get(f"/api/v1/genai/history/{scan_id}", params=params)
+            exported = await client.get("/api/v1/genai/history/export", params=params)
+            return listed.json()["history"][0], selected.json()["history"][0], item.json(), exported.text
+
+    listed, selected, item, exported = asyncio.run(run())
+    assert "product_id" not in listed and "product_id" not in selected and "product_id" not in item
+    assert "product_id" not in exported
+    # The full analysis is still filled in from the product
+    assert listed["response"]["calories"] == item["response"]["calories"] == "190"
+    assert selected["response"] == {"calories": "190"}
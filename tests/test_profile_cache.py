@@ -0,0 +1,99 @@
+"""Profile reads through the two-tier cache, write refresh and conditional GETs.
+
+The shared tier is LocalProfileCacheBackend, standing in for Redis; two
+ProfileCache instances over one backend play two workers.
+"""
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+import app.services.profile as profile_service
+from app.services.profile_cache import LocalProfileCacheBackend, ProfileCache
+from tests.stubs import MemoryDatabase, app_client
+
+PROFILE_URL = "/api/v1/user/profile"
+
+PROFILE = {
+    "gender": "female",
+    "date_of_birth": "1990-04-02",
+    "height": 165.0,
+    "weight": 60.0,
+    "goal": "stay_fit",
+}
+
+@pytest.fixture
+def setup(monkeypatch):
+    db = MemoryDatabase()
+    monkeypatch.setattr(profile_service, "get_collection", lambda name: db[name])
+    backend = LocalProfileCacheBackend()
+    cache = ProfileCache(max_entries=100, ttl_seconds=60, backend=backend)
+    monkeypatch.setattr(profile_service, "profile_cache", cache)
+    monkeypatch.setattr(profile_service, "known_users", {})
+    user_id = ObjectId()
+    db["users"].docs.append({"_id": user_id, "email": "ann@example.com"})
+    return db, backend, cache, str(user_id)
+
+def test_reads_go_through_both_tiers(setup):
+    db, backend, cache, user_id = setup
+    db["user_profiles"].docs.append({
+        "_id": ObjectId(), "user_id": user_id, **PROFILE,
+        "created_at": "2026-01-01T00:00:00", "updated_at": "2026-01-01T00:00:00",
+    })
+
+    async def run():
+        async with app_client(db) as client:
+            first = await client.get(f"{PROFILE_URL}/{user_id}")
+            # Changed behind the cache's back: cached reads must not see it
+            db["user_profiles"].docs[0]["weight"] = 99.0
+            second = await client.get(f"{PROFILE_URL}/{user_id}")
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert first.status_code == second.status_code == 200
+    assert first.json()["weight"] == second.json()["weight"] == 60.0
+    assert (cache.misses, cache.memory_hits) == (1, 1)
+    assert asyncio.run(backend.get(f"profile:{user_id}"))["weight"] == 60.0
+
+    # Another worker's empty memory tier is filled from the shared backend
+    other_worker = ProfileCache(max_entries=100, ttl_seconds=60, backend=backend)
+    assert asyncio.run(other_worker.get(user_id))["weight"] == 60.0
+    assert other_worker.shared_hits == 1
+
+def test_writes_refresh_the_cache(setup):
+    db, backend, cache, user_id = setup
+
+    async def run():
+        async with app_client(db) as client:
+            created = await client.post(PROFILE_URL, params={"user_id": user_id}, json=PROFILE)
+            before = await client.get(f"{PROFILE_URL}/{user_id}")
+            updated = await client.put(PROFILE_URL, params={"user_id": user_id}, json={**PROFILE, "weight": 58.5})
+            after = await client.get(f"{PROFILE_URL}/{user_id}")
+            return created, before, updated, after
+
+    created, before, updated, after = asyncio.run(run())
+    assert created.status_code == updated.status_code == 200
+    assert before.json()["weight"] == 60.0
+    assert after.json()["weight"] == 58.5
+    assert after.headers["etag"] != before.headers["etag"]
+    # Both reads were served from the cache the writes filled
+    assert cache.misses == 0
+    assert asyncio.run(backend.get(f"profile:{user_id}"))["weight"] == 58.5
+
+def test_conditional_get_returns_304(setup):
+    db, backend, cache, user_id = setup
+
+    async def run():
+        async with app_client(db) as client:
+            await client.post(PROFILE_URL, params={"user_id": user_id}, json=PROFILE)
+            etag = (await client.get(f"{PROFILE_URL}/{user_id}")).headers["etag"]
+            statuses = []
+            for if_none_match in (etag, f"W/{etag}", f'"stale", {etag}', "*", '"stale"'):
+                response = await client.get(f"{PROFILE_URL}/{user_id}", headers={"If-None-Match": if_none_match})
+                statuses.append(response.status_code)
+                if response.status_code == 304:
+                    assert response.content == b""
+                    assert response.headers["etag"] == etag
+            return statuses
+
+    assert asyncio.run(run()) == [304, 304, 304, 304, 200]